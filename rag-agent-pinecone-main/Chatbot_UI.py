@@ -1,12 +1,12 @@
 import streamlit as st
-import requests
-import time
 import os
+import time
 import asyncio
+import threading
+from collections import OrderedDict
 
-# Backend-free mode: call retrieval and LLM directly
-from topic_based_chatbot import process_question_with_topic
-from topic_based_retriever import get_available_topics_from_index
+# Backend-free mode: retrieval and LLM modules are imported where first used, so plain
+# widget reruns don't pay for loading LangChain/OpenAI/Pinecone
 
 # Pinecone client (support both new and legacy)
 def _get_secret(name: str, default: str = "") -> str:
@@ -23,8 +23,11 @@ def get_pinecone_index():
     if not api_key:
         raise RuntimeError("PINECONE_API_KEY is not set in Streamlit secrets or environment")
     try:
-        # New SDK style
-        from pinecone import Pinecone
+        # New SDK style; prefer the gRPC transport when pinecone[grpc] is installed
+        try:
+            from pinecone.grpc import PineconeGRPC as Pinecone
+        except ImportError:
+            from pinecone import Pinecone
         pc = Pinecone(api_key=api_key)
         return pc.Index(index_name)
     except Exception:
@@ -33,6 +36,13 @@ def get_pinecone_index():
         pinecone.init(api_key=api_key, environment=os.getenv("PINECONE_ENVIRONMENT", "us-east-1-aws"))
         return pinecone.Index(index_name)
 
+@st.cache_resource(show_spinner=False)
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """Start one long-lived event loop so OpenAI/httpx connection pools survive across questions."""
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True, name="chatbot-event-loop").start()
+    return loop
+
 # Page config
 st.set_page_config(
     page_title="Noorbakshia365 AI Bot",
@@ -260,11 +270,97 @@ API_BASE_URL = _get_secret("API_BASE_URL", "")
 @st.cache_data(show_spinner=False)
 def load_topics_direct(pinecone_index):
     try:
+        from topic_based_retriever import get_available_topics_from_index
         topics = get_available_topics_from_index(pinecone_index)
         return topics, True
     except Exception:
         return DEFAULT_TOPICS, False
 
+ANSWER_MEMO_TTL = 3600  # seconds
+ANSWER_MEMO_MAX_ENTRIES = 2000
+
+@st.cache_resource(show_spinner=False)
+def get_answer_memo():
+    """Process-wide answer memo shared by all sessions: (OrderedDict, lock)."""
+    return OrderedDict(), threading.Lock()
+
+def lookup_answer(key: tuple):
+    """Return a memoized answer for (normalized question, topic) if it is still fresh."""
+    memo, lock = get_answer_memo()
+    with lock:
+        entry = memo.get(key)
+        if entry is None or time.monotonic() - entry[0] > ANSWER_MEMO_TTL:
+            return None
+        memo.move_to_end(key)
+        return entry[1]
+
+def remember_answer(key: tuple, result: dict) -> None:
+    """Memoize an answer, evicting the least recently used entries past the cap."""
+    memo, lock = get_answer_memo()
+    with lock:
+        memo[key] = (time.monotonic(), result)
+        memo.move_to_end(key)
+        while len(memo) > ANSWER_MEMO_MAX_ENTRIES:
+            memo.popitem(last=False)
+
+def iterate_on_event_loop(async_iterator):
+    """Drive an async iterator on the persistent event loop from Streamlit's thread."""
+    async def next_item():
+        return await async_iterator.__anext__()
+    
+    loop = get_event_loop()
+    while True:
+        try:
+            yield asyncio.run_coroutine_threadsafe(next_item(), loop).result()
+        except StopAsyncIteration:
+            return
+
+class AnswerStreamInterrupted(Exception):
+    """Raised when streaming fails after part of the answer was already shown."""
+
+def stream_answer(pinecone_index, question: str, topic_folder) -> dict:
+    """Retrieve context, then stream the answer into the chat as tokens arrive."""
+    from topic_based_chatbot import (
+        retrieve_context_for_question, has_sufficient_context, insufficient_context_answer,
+        stream_answer_with_dual_question, extract_topic_name_from_context,
+        is_rejectable_question, REJECTED_QUESTION_ANSWER
+    )
+    # Same guard as process_question_with_topic: junk input skips translation, embedding and Pinecone
+    if is_rejectable_question(question):
+        st.chat_message('assistant').write(REJECTED_QUESTION_ANSWER)
+        return {"answer": REJECTED_QUESTION_ANSWER, "topic_name": None, "metadata": {"rejected": True}}
+    
+    with st.spinner("🤔 AI Assistant is thinking..."):
+        retrieval = asyncio.run_coroutine_threadsafe(
+            retrieve_context_for_question(pinecone_index, question, topic_folder),
+            get_event_loop()
+        ).result()
+    context = retrieval["context"]
+    metadata = {"translations": retrieval["translations"]}
+    
+    if not has_sufficient_context(context):
+        answer = insufficient_context_answer(topic_folder)
+        st.chat_message('assistant').write(answer)
+        metadata["warning"] = "Context too short or empty"
+        return {"answer": answer, "topic_name": None, "metadata": metadata}
+    
+    streamed = False
+    def mark_streamed(chunks):
+        nonlocal streamed
+        for chunk in chunks:
+            streamed = True
+            yield chunk
+    
+    tokens = stream_answer_with_dual_question(question, retrieval["urdu_query"], context)
+    with st.chat_message('assistant'):
+        try:
+            answer = st.write_stream(mark_streamed(iterate_on_event_loop(tokens)))
+        except Exception as e:
+            if streamed:
+                raise AnswerStreamInterrupted(str(e)) from e
+            raise
+    return {"answer": answer.strip(), "topic_name": extract_topic_name_from_context(context), "metadata": metadata}
+
 # Default topics as fallback (using original names)
 DEFAULT_TOPICS = [
     {"folder_name": "all", "display_name": "All Topics", "description": "Search across all Islamic knowledge categories"},
@@ -289,6 +385,7 @@ DEFAULT_TOPICS = [
 def load_topics_from_api(api_url):
     """Load topics from API with fallback to default topics."""
     try:
+        import requests
         response = requests.get(f"{api_url}/topics", timeout=2)  # Shorter timeout
         if response.ok:
             topics_data = response.json()
@@ -380,14 +477,9 @@ for msg in st.session_state['messages']:
                 st.caption(f"📂 Source Topic: {topic_info['topic_name']}")
 
 # Question input
-question_input = st.text_input(
-    "💬 Ask your question:",
-    placeholder="e.g., How to perform wudu? / کیسے وضو کریں؟ / كيف تتوضأ؟",
-    key="question_input"
-)
+question_input = st.chat_input("💬 Ask your question: e.g., How to perform wudu? / کیسے وضو کریں؟ / كيف تتوضأ؟")
 
-# Send button
-if st.button("🚀 Ask AI Assistant", type="primary"):
+if question_input:
     if not question_input.strip():
         st.warning("Please enter a question.")
         st.stop()
@@ -395,54 +487,61 @@ if st.button("🚀 Ask AI Assistant", type="primary"):
     # Add user message to chat
     st.session_state['messages'].append({'role': 'user', 'content': question_input})
     st.chat_message('user').write(question_input)
+    topic_folder = st.session_state['selected_topic'] if st.session_state['selected_topic'] != 'all' else None
     # Get answer via direct backend-free call (preferred), fallback to API if configured
-    with st.spinner("🤔 AI Assistant is thinking..."):
+    try:
         try:
-            try:
-                pinecone_index = get_pinecone_index()
-                result = asyncio.run(process_question_with_topic(
-                    pinecone_index,
-                    question_input,
-                    st.session_state['selected_topic'] if st.session_state['selected_topic'] != 'all' else None
-                ))
-                answer = result.get("answer", "")
-                topic_name = result.get("topic_name")
-                metadata = result.get("metadata", {})
-                topic_info = {
-                    'topic_name': topic_name,
-                    'topic_folder': st.session_state['selected_topic'],
-                    'selected_topic': st.session_state['selected_topic']
-                }
-                st.session_state['messages'].append({
-                    'role': 'assistant',
-                    'content': answer,
-                    'translations': metadata.get("translations", ""),
-                    'topic_info': topic_info
-                })
-                st.chat_message('assistant').write(answer)
-            except Exception as direct_err:
-                if not API_BASE_URL:
-                    raise
-                endpoint = f"{API_BASE_URL}/ask/"
-                payload = {
-                    "question": question_input,
-                    "topic_folder": st.session_state['selected_topic'] if st.session_state['selected_topic'] != 'all' else None
-                }
+            from topic_based_retriever import normalize_query
+            pinecone_index = get_pinecone_index()
+            memo_key = (normalize_query(question_input), topic_folder)
+            result = lookup_answer(memo_key)
+            if result is None:
+                result = stream_answer(pinecone_index, question_input, topic_folder)
+                # Only memoize real answers: a "no context" reply may change once more data is indexed
+                if "warning" not in result["metadata"] and "rejected" not in result["metadata"]:
+                    remember_answer(memo_key, result)
+            else:
+                st.chat_message('assistant').write(result["answer"])
+            answer = result.get("answer", "")
+            topic_name = result.get("topic_name")
+            metadata = result.get("metadata", {})
+            topic_info = {
+                'topic_name': topic_name,
+                'topic_folder': st.session_state['selected_topic'],
+                'selected_topic': st.session_state['selected_topic']
+            }
+            st.session_state['messages'].append({
+                'role': 'assistant',
+                'content': answer,
+                'translations': metadata.get("translations", ""),
+                'topic_info': topic_info
+            })
+        except Exception as direct_err:
+            # Falling back after a partial answer was shown would post a second answer
+            if not API_BASE_URL or isinstance(direct_err, AnswerStreamInterrupted):
+                raise
+            import requests
+            endpoint = f"{API_BASE_URL}/ask/"
+            payload = {
+                "question": question_input,
+                "topic_folder": topic_folder
+            }
+            with st.spinner("🤔 AI Assistant is thinking..."):
                 response = requests.post(endpoint, json=payload, timeout=60)
-                data = response.json()
-                answer = data.get("answer", "")
-                topic_info = {
-                    'topic_name': data.get('topic_name'),
-                    'topic_folder': data.get('topic_folder'),
-                    'selected_topic': st.session_state['selected_topic']
-                }
-                st.session_state['messages'].append({'role': 'assistant','content': answer,'translations': data.get("metadata", {}).get("translations", ""),'topic_info': topic_info})
-                st.chat_message('assistant').write(answer)
-                
-        except Exception as e:
-            error_msg = f"Connection error: {e}"
-            st.error(error_msg)
-            st.session_state['messages'].append({'role': 'assistant', 'content': error_msg})
+            data = response.json()
+            answer = data.get("answer", "")
+            topic_info = {
+                'topic_name': data.get('topic_name'),
+                'topic_folder': data.get('topic_folder'),
+                'selected_topic': st.session_state['selected_topic']
+            }
+            st.session_state['messages'].append({'role': 'assistant','content': answer,'translations': data.get("metadata", {}).get("translations", ""),'topic_info': topic_info})
+            st.chat_message('assistant').write(answer)
+            
+    except Exception as e:
+        error_msg = f"Connection error: {e}"
+        st.error(error_msg)
+        st.session_state['messages'].append({'role': 'assistant', 'content': error_msg})
 
 # Clear chat button with custom styling
 if st.button("🗑️ Clear Chat", key="clear_chat", help="Clear all chat messages"):
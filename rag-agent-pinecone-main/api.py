@@ -1,16 +1,20 @@
 import os
 import time
+import logging
 from fastapi import FastAPI, HTTPException, Depends, Request
-from fastapi.responses import ORJSONResponse
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from typing import Any
-from models import AskResponse, TopicsResponse, TopicInfo
+from models import AskRequest, AskResponse, TopicsResponse, TopicInfo
 from fastapi.middleware.cors import CORSMiddleware
-from topic_based_chatbot import process_question_with_topic
+from topic_based_chatbot import process_question_with_topic, stream_question_with_topic
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+# INFO keeps one summary line per question; LOG_LEVEL=DEBUG restores the step-by-step trace
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
 app = FastAPI(default_response_class=ORJSONResponse)
 
 print("🚀 Starting Islamic Knowledge RAG API...")
@@ -33,10 +37,14 @@ def get_pinecone_index():
     if app.state.pinecone_index is None:
         try:
             try:
-                from pinecone import Pinecone
+                # gRPC transport (pinecone[grpc]) multiplexes queries over one HTTP/2 connection
+                from pinecone.grpc import PineconeGRPC as Pinecone
             except ImportError:
-                import pinecone
-                Pinecone = pinecone.Pinecone
+                try:
+                    from pinecone import Pinecone
+                except ImportError:
+                    import pinecone
+                    Pinecone = pinecone.Pinecone
             pinecone_api_key = os.getenv("PINECONE_API_KEY")
             index_name = os.getenv("PINECONE_INDEX_NAME", "islamic-knowledge-topics-v2")
             
@@ -93,6 +101,23 @@ async def ask(
         print(f"❌ API error: {e}")
         raise HTTPException(500, f"Processing error: {str(e)}")
 
+@app.post("/ask/stream")
+async def ask_stream(
+    body: AskRequest,
+    pinecone_index: Any = Depends(get_pinecone_index),
+):
+    """Streaming endpoint: same pipeline as /ask/, but the answer is sent as plain text while it is generated."""
+    print(f"\n🔥 NEW REQUEST RECEIVED: /ask/stream")
+    if not body.question.strip():
+        raise HTTPException(400, "Provide a 'question' in the request body")
+    
+    print(f"📝 Question: '{body.question}'")
+    print(f"📂 Topic filter: {body.topic_folder or 'All Topics'}")
+    return StreamingResponse(
+        stream_question_with_topic(pinecone_index, body.question, body.topic_folder),
+        media_type="text/plain; charset=utf-8"
+    )
+
 @app.get("/topics", response_model=TopicsResponse)
 async def get_topics(pinecone_index: Any = Depends(get_pinecone_index)):
     """Get available topics for filtering."""
@@ -120,7 +145,7 @@ async def health_check():
             "status": "healthy",
             "timestamp": time.time(),
             "pinecone_connection": "connected",
-            "endpoints": ["/ask", "/topics"],
+            "endpoints": ["/ask", "/ask/stream", "/topics"],
             "llm_calls_per_query": 2,
             "description": "Topic-based RAG API with translation and filtering"
         }
@@ -1,24 +1,135 @@
 import os
 import time
+import asyncio
+import logging
+import copy
+from functools import lru_cache
+from collections import OrderedDict
 from langchain_openai import ChatOpenAI
 from langchain.prompts import PromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from prompts import QA_PROMPT, TRANSLATION_PROMPT
-from topic_based_retriever import get_relevant_documents_by_topic
+from langchain_core.output_parsers import JsonOutputParser, StrOutputParser
+from prompts import FUSED_QA_PROMPT, QA_PROMPT, TRANSLATION_PROMPT
+from topic_based_retriever import (
+    search_documents_by_topic,
+    prepare_context_from_documents_with_attribution, embed_query_vector
+)
 from dotenv import load_dotenv
-from typing import Any, Dict, Optional
+from typing import Any, AsyncIterator, Dict, Optional
 import re
-from langdetect import detect, LangDetectException
-
+import numpy as np
+import httpx
+try:
+    import h2  # noqa: F401  # HTTP/2 support for httpx (pip install httpx[http2])
+    _HTTP2_AVAILABLE = True
+except ImportError:
+    _HTTP2_AVAILABLE = False
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Precompiled patterns for the language checks that run on every question
+_ARABIC_URDU_RE = re.compile(r'[\u0600-\u06FF\u0750-\u077F\u08A0-\u08FF\uFB50-\uFDFF\uFE70-\uFEFF]')
+_ENGLISH_RE = re.compile(r'[a-zA-Z]')
+_PUNCTUATION_RE = re.compile(r'[^\w\s]')
+_TOPIC_ATTRIBUTION_RE = re.compile(r'\[Source \d+: ([^-]+) -')
+_ARABIC_URDU_RANGES = ((0x0600, 0x06FF), (0x0750, 0x077F), (0x08A0, 0x08FF), (0xFB50, 0xFDFF), (0xFE70, 0xFEFF))
+_NUMPY_MIN_LENGTH = 256  # Below this the regex is cheaper than NumPy setup
+
+def _count_matches(pattern: re.Pattern, text: str) -> int:
+    """Count single-character matches by deleting them, without building a list of match strings."""
+    return len(text) - len(pattern.sub('', text))
+
+def _script_ratios(text: str) -> tuple:
+    """Fractions of Arabic/Urdu and ASCII-letter code points, from one NumPy pass for long text."""
+    if not text:
+        return 0.0, 0.0
+    if len(text) < _NUMPY_MIN_LENGTH:
+        return _count_matches(_ARABIC_URDU_RE, text) / len(text), _count_matches(_ENGLISH_RE, text) / len(text)
+    code_points = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+    mask = np.zeros(code_points.shape, dtype=bool)
+    for low, high in _ARABIC_URDU_RANGES:
+        mask |= (code_points >= low) & (code_points <= high)
+    lowered = code_points | 0x20  # Folds A-Z onto a-z
+    english = (lowered >= 0x61) & (lowered <= 0x7A)
+    return float(mask.mean()), float(english.mean())
+
+def _arabic_urdu_ratio(text: str) -> float:
+    """Fraction of Arabic/Urdu code points, vectorized with NumPy for long text."""
+    if len(text) < _NUMPY_MIN_LENGTH:
+        return _count_matches(_ARABIC_URDU_RE, text) / len(text) if text else 0.0
+    return _script_ratios(text)[0]
+
+# Exact-match response cache keyed by (casefolded question, topic folder)
+RESPONSE_CACHE_MAX_ENTRIES = 1024
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))  # seconds
+_response_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+_ANSWER_ERROR_PREFIX = "Sorry, an error occurred"
+REJECTED_QUESTION_ANSWER = "Please ask a more specific question."
+
+# Semantic cache: unit-normalized question embeddings in a ring buffer, matched by cosine similarity.
+# Entries only match within the same scope (topic, question language, answer mode): the answer
+# language follows the original question, so translations of one question must not share answers
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.93"))
+SEMANTIC_CACHE_MAX_ENTRIES = 2048
+# Keys are int8-quantized with a per-vector scale: 4x smaller than float32 and
+# cosine similarity stays within ~1e-3, far below the threshold's margin
+_semantic_keys: Optional[np.ndarray] = None  # (SEMANTIC_CACHE_MAX_ENTRIES, dim) int8
+_semantic_scales = np.zeros(SEMANTIC_CACHE_MAX_ENTRIES, dtype=np.float32)
+_SEMANTIC_SCAN_ROWS = 256  # Rows upcast per block during lookup, bounding the temporary copy
+_semantic_scopes = np.empty(SEMANTIC_CACHE_MAX_ENTRIES, dtype=object)
+_semantic_values: list = [None] * SEMANTIC_CACHE_MAX_ENTRIES
+_semantic_count = 0
+_semantic_next = 0
+
+def _semantic_scope(topic_folder: Optional[str], question: str, fused: bool) -> str:
+    """Scope string semantic cache entries must share: topic, question language and answer mode."""
+    return f"{topic_folder or ''}\x00{detect_question_language(question)}\x00{'fused' if fused else 'dual'}"
+
+def _semantic_cache_lookup(query_vector: np.ndarray, scope: str) -> Optional[Dict[str, Any]]:
+    """Return the cached result of the most similar prior question in the same scope, if close enough."""
+    if not _semantic_count or _semantic_keys.shape[1] != query_vector.shape[0]:
+        return None
+    similarities = np.empty(_semantic_count, dtype=np.float32)
+    for start in range(0, _semantic_count, _SEMANTIC_SCAN_ROWS):
+        stop = min(start + _SEMANTIC_SCAN_ROWS, _semantic_count)
+        similarities[start:stop] = _semantic_keys[start:stop] @ query_vector
+    similarities *= _semantic_scales[:_semantic_count]
+    similarities[_semantic_scopes[:_semantic_count] != scope] = -1.0
+    best = int(similarities.argmax())
+    if similarities[best] < SEMANTIC_CACHE_THRESHOLD:
+        return None
+    return _semantic_values[best]
+
+def _semantic_cache_store(query_vector: np.ndarray, scope: str, result: Dict[str, Any]) -> None:
+    """Remember a result under its question embedding, overwriting the oldest entry when full."""
+    global _semantic_keys, _semantic_count, _semantic_next
+    if _semantic_keys is None:
+        _semantic_keys = np.zeros((SEMANTIC_CACHE_MAX_ENTRIES, query_vector.shape[0]), dtype=np.int8)
+    elif _semantic_keys.shape[1] != query_vector.shape[0]:
+        return
+    scale = float(np.abs(query_vector).max()) / 127 or 1.0
+    _semantic_keys[_semantic_next] = np.round(query_vector / scale).astype(np.int8)
+    _semantic_scales[_semantic_next] = scale
+    _semantic_scopes[_semantic_next] = scope
+    _semantic_values[_semantic_next] = result
+    _semantic_next = (_semantic_next + 1) % SEMANTIC_CACHE_MAX_ENTRIES
+    _semantic_count = min(_semantic_count + 1, SEMANTIC_CACHE_MAX_ENTRIES)
+
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
+# One keep-alive connection pool shared by every chat call, sized for concurrent requests
+_http_async_client = httpx.AsyncClient(
+    limits=httpx.Limits(max_connections=128, max_keepalive_connections=64),
+    http2=_HTTP2_AVAILABLE,
+    timeout=httpx.Timeout(120.0, connect=10.0)
+)
+
 # Initialize LLM
 llm = ChatOpenAI(
     model="gpt-4.1",
     temperature=0.1,
-    openai_api_key=OPENAI_API_KEY
+    openai_api_key=OPENAI_API_KEY,
+    http_async_client=_http_async_client
 )
 
 # Initialize prompt templates
@@ -32,51 +143,77 @@ qa_prompt_template = PromptTemplate(
     template=QA_PROMPT
 )
 
+fused_qa_prompt_template = PromptTemplate(
+    input_variables=["original_question", "context"],
+    template=FUSED_QA_PROMPT
+)
+
 # Initialize chains
-translation_chain = translation_prompt_template | llm | StrOutputParser()
+# JSON mode guarantees a parseable {"urdu": ...} object instead of free text to scan
+translation_chain = translation_prompt_template | llm.bind(response_format={"type": "json_object"}) | JsonOutputParser()
 qa_chain = qa_prompt_template | llm | StrOutputParser()
+fused_qa_chain = fused_qa_prompt_template | llm | JsonOutputParser()
+
+# Opt-in: answer English questions with one fused translate+answer call instead of two
+FUSED_QA_ENABLED = os.getenv("FUSED_QA", "").lower() in ("1", "true", "yes")
+
+# Opt-in: for translated questions, always retrieve with both the Urdu and the original
+# question and merge the results
+DUAL_RETRIEVAL_ENABLED = os.getenv("DUAL_RETRIEVAL", "").lower() in ("1", "true", "yes")
+MAX_MERGED_SOURCES = 5
+# Opt-in: also search with the original question while translating, and skip the Urdu search
+# when its best match scores at least this much; unset means always retrieve with the Urdu query
+_original_min_score = os.getenv("ORIGINAL_QUERY_MIN_SCORE")
+ORIGINAL_QUERY_MIN_SCORE = float(_original_min_score) if _original_min_score else None
 
+@lru_cache(maxsize=4096)
 def detect_question_language(question: str) -> str:
     """Detect the language of the question."""
     try:
         # Check for Arabic/Urdu characters first
-        arabic_urdu_chars = re.findall(r'[\u0600-\u06FF\u0750-\u077F\u08A0-\u08FF\uFB50-\uFDFF\uFE70-\uFEFF]', question)
-        if len(arabic_urdu_chars) > len(question) * 0.3:  # If more than 30% are Arabic/Urdu chars
+        if _arabic_urdu_ratio(question) > 0.3:  # If more than 30% are Arabic/Urdu chars
             return 'ar'
         
         # Clean the question for language detection
-        clean_question = re.sub(r'[^\w\s]', '', question)
+        clean_question = _PUNCTUATION_RE.sub('', question)
         if len(clean_question.strip()) < 3:
             return 'en'
         
-        lang = detect(clean_question)
-        
-        if lang in ['ar', 'fa', 'ur']:
-            return 'ar'
-        elif lang == 'en':
-            return 'en'
-        else:
+        # Pure ASCII (English, Roman Urdu) needs no further checks
+        if clean_question.isascii():
             return 'en'
+        
+        # Mixed script: we only need Arabic-script vs. everything else, which the
+        # Unicode blocks decide directly; Arabic script wins if it outweighs Latin letters
+        arabic_ratio, english_ratio = _script_ratios(clean_question)
+        return 'ar' if arabic_ratio > english_ratio else 'en'
             
-    except LangDetectException:
+    except Exception:
         return 'en'
 
 def should_translate_question(question: str) -> bool:
     """Check if question needs translation to Urdu for retrieval."""
+    # Without a single Arabic-script character every detection path ends in 'en';
+    # search() stops at the first such character, so Urdu questions pay O(1) here
+    if not _ARABIC_URDU_RE.search(question):
+        return True
     question_lang = detect_question_language(question)
     return question_lang == 'en'  # Only translate if English
 
+CONTEXT_LANGUAGE_SAMPLE = 2048  # characters
+
 def detect_context_language(context: str) -> str:
     """Detect the primary language of the context."""
     try:
+        # A leading sample is enough to tell the scripts apart on multi-KB contexts
+        arabic_ratio, english_ratio = _script_ratios(context[:CONTEXT_LANGUAGE_SAMPLE])
+        
         # Check for Arabic/Urdu characters
-        arabic_urdu_chars = re.findall(r'[\u0600-\u06FF\u0750-\u077F\u08A0-\u08FF\uFB50-\uFDFF\uFE70-\uFEFF]', context)
-        if len(arabic_urdu_chars) > len(context) * 0.2:  # If more than 20% are Arabic/Urdu chars
+        if arabic_ratio > 0.2:  # If more than 20% are Arabic/Urdu chars
             return 'ar'
         
         # Check for English
-        english_chars = re.findall(r'[a-zA-Z]', context)
-        if len(english_chars) > len(context) * 0.3:  # If more than 30% are English chars
+        if english_ratio > 0.3:  # If more than 30% are English chars
             return 'en'
         
         return 'ar'  # Default to Arabic/Urdu for Islamic content
@@ -87,34 +224,27 @@ def detect_context_language(context: str) -> str:
 async def translate_query_for_retrieval(question: str) -> Dict[str, str]:
     """Translate query to Urdu for better retrieval."""
     try:
-        print("🔄 Translating query to Urdu...")
+        logger.debug("🔄 Translating query to Urdu...")
         
         # Use the translation prompt template
         translation_response = await translation_chain.ainvoke({"question": question})
-        translations = translation_response.strip()
+        urdu_query = str(translation_response.get("urdu", "")).strip()
         
-        # Extract Urdu translation
-        urdu_query = ""
-        
-        for line in translations.split('\n'):
-            if line.startswith('Urdu:'):
-                urdu_query = line.replace('Urdu:', '').strip()
-                break
-        
-        # If no proper format found, use the whole response as Urdu
+        # An empty translation must not reach the vector search; fall back to the original question
         if not urdu_query:
-            urdu_query = translations.strip()
+            logger.warning("⚠️ Translation returned no Urdu text, using the original question")
+            urdu_query = question
         
         result = {
-            "translations": translations,
+            "translations": f"Urdu: {urdu_query}",
             "urdu_query": urdu_query
         }
         
-        print(f"✅ Translation to Urdu completed: '{urdu_query}'")
+        logger.debug("✅ Translation to Urdu completed: '%s'", urdu_query)
         return result
         
     except Exception as e:
-        print(f"❌ Translation error: {e}")
+        logger.error("❌ Translation error: %s", e)
         return {
             "translations": f"Translation failed: {str(e)}",
             "urdu_query": question  # Fallback to original question
@@ -123,7 +253,7 @@ async def translate_query_for_retrieval(question: str) -> Dict[str, str]:
 async def generate_answer_with_dual_question(original_question: str, urdu_question: str, context: str) -> str:
     """Generate answer using both the original and Urdu queries with the new QA prompt."""
     try:
-        print("🤖 Generating answer with LLM (dual-question prompt)...")
+        logger.debug("🤖 Generating answer with LLM (dual-question prompt)...")
         
         if not context:
             return "Sorry, I couldn't find relevant information in the knowledge base."
@@ -137,165 +267,332 @@ async def generate_answer_with_dual_question(original_question: str, urdu_questi
         
         final_answer = answer_response.strip()
         
-        print(f"✅ Answer generated")
+        logger.debug("✅ Answer generated")
         return final_answer
         
     except Exception as e:
-        print(f"❌ Answer generation error: {e}")
-        return f"Sorry, an error occurred while generating the answer: {str(e)}"
+        logger.error("❌ Answer generation error: %s", e)
+        return f"{_ANSWER_ERROR_PREFIX} while generating the answer: {str(e)}"
+
+async def generate_answer_fused(original_question: str, context: str) -> Dict[str, str]:
+    """Translate the question to Urdu and answer it in a single LLM call."""
+    try:
+        logger.debug("🤖 Generating answer with LLM (fused translate + answer prompt)...")
+        
+        result = await fused_qa_chain.ainvoke({
+            "original_question": original_question,
+            "context": context
+        })
+        
+        logger.debug("✅ Fused answer generated")
+        return {
+            "urdu_question": str(result.get("urdu_question", "")).strip(),
+            "answer": str(result.get("answer", "")).strip()
+        }
+        
+    except Exception as e:
+        logger.error("❌ Fused answer generation error: %s", e)
+        return {
+            "urdu_question": "",
+            "answer": f"{_ANSWER_ERROR_PREFIX} while generating the answer: {str(e)}"
+        }
+
+async def stream_answer_with_dual_question(original_question: str, urdu_question: str, context: str) -> AsyncIterator[str]:
+    """Stream the dual-question answer as the LLM generates it."""
+    async for chunk in qa_chain.astream({
+        "original_question": original_question,
+        "urdu_question": urdu_question,
+        "context": context
+    }):
+        yield chunk
+
+STREAM_FLUSH_INTERVAL = 0.05  # seconds; coalesces token chunks before they hit the transport
+
+async def _coalesce_chunks(chunks: AsyncIterator[str], interval: float = STREAM_FLUSH_INTERVAL) -> AsyncIterator[str]:
+    """Merge token chunks arriving within the same interval into one piece of text."""
+    buffer = []
+    last_flush = 0.0  # The first chunk goes out immediately
+    async for chunk in chunks:
+        buffer.append(chunk)
+        now = time.monotonic()
+        if now - last_flush >= interval:
+            yield "".join(buffer)
+            buffer = []
+            last_flush = now
+    if buffer:
+        yield "".join(buffer)
+
+def is_rejectable_question(question: str) -> bool:
+    """Too-short or punctuation-only input can't retrieve anything useful."""
+    stripped_question = question.strip()
+    return len(stripped_question) < 3 or not any(c.isalnum() for c in stripped_question)
+
+async def stream_question_with_topic(pinecone_index: Any, question: str, topic_folder: str = None) -> AsyncIterator[str]:
+    """Streaming counterpart of process_question_with_topic: yields the answer text as it is generated."""
+    if is_rejectable_question(question):
+        logger.info("⚠️ Rejected question without enough content: '%s'", question)
+        yield REJECTED_QUESTION_ANSWER
+        return
+    try:
+        retrieval = await retrieve_context_for_question(pinecone_index, question, topic_folder)
+        if not has_sufficient_context(retrieval["context"]):
+            yield insufficient_context_answer(topic_folder)
+            return
+        tokens = stream_answer_with_dual_question(question, retrieval["urdu_query"], retrieval["context"])
+        async for text in _coalesce_chunks(tokens):
+            yield text
+    except Exception as e:
+        # The response has already started, so report the error in the stream instead of dropping the connection
+        logger.exception("❌ Error while streaming answer (topic: %s): %s", topic_folder or "All Topics", e)
+        yield f"{_ANSWER_ERROR_PREFIX}: {str(e)}"
 
 def extract_topic_name_from_context(context: str) -> Optional[str]:
     """Extract topic name from context for response metadata."""
     try:
         # Look for topic name in source attribution
-        import re
-        topic_match = re.search(r'\[Source \d+: ([^-]+) -', context)
+        topic_match = _TOPIC_ATTRIBUTION_RE.search(context)
         if topic_match:
             return topic_match.group(1).strip()
         return None
     except Exception:
         return None
 
-async def process_question_with_topic(pinecone_index: Any, question: str, topic_folder: str = None) -> Dict[str, Any]:
-    """Main function: Process question with topic filtering - exactly 2 LLM calls."""
-    start_time = time.time()
+def _merge_documents(*document_lists: list) -> list:
+    """Merge retrieval results in order, dropping repeated passages and capping the source count."""
+    merged = []
+    seen = set()
+    for documents in document_lists:
+        for doc in documents:
+            key = (doc.get("source_url") or doc.get("source"), doc.get("text"))
+            if key in seen:
+                continue
+            seen.add(key)
+            merged.append(doc)
+            if len(merged) == MAX_MERGED_SOURCES:
+                return merged
+    return merged
+
+def _count_sources(documents: list) -> int:
+    """Number of sources prepare_context_from_documents_with_attribution emits for these documents."""
+    return sum(1 for doc in documents if doc["text"].strip())
+
+async def retrieve_context_for_question(pinecone_index: Any, question: str, topic_folder: str = None) -> Dict[str, Any]:
+    """Translate the question to Urdu when needed and retrieve topic-filtered context."""
+    # SIMPLE TRANSLATION: Translate English to Urdu for retrieval
+    needs_translation = should_translate_question(question)
     
-    try:
-        print("\n" + "🚀" * 50)
-        print("🤖 STARTING TOPIC-BASED QUESTION PROCESSING")
-        print("🚀" * 50)
-        print(f"📝 Question: '{question}'")
-        print(f"📂 Selected Topic: {topic_folder or 'All Topics'}")
-        print(f"📏 Question length: {len(question)} characters")
-        print(f"⏰ Start time: {time.strftime('%H:%M:%S')}")
-        
-        # SIMPLE TRANSLATION: Translate English to Urdu for retrieval
-        needs_translation = should_translate_question(question)
-        
-        if needs_translation:
-            print(f"\n🔄 STEP 1: ENGLISH TO URDU TRANSLATION")
-            print(f"   🔄 Translating English query to Urdu for better retrieval...")
+    if needs_translation:
+        original_documents = None
+        if DUAL_RETRIEVAL_ENABLED or ORIGINAL_QUERY_MIN_SCORE is not None:
+            # The original-question search overlaps the translation call; the Urdu search still waits for it
+            logger.debug("🔄 STEP 1: translating to Urdu while retrieving with the original question (topic: %s)",
+                         topic_folder or "All Topics")
+            translation_result, original_documents = await asyncio.gather(
+                translate_query_for_retrieval(question),
+                search_documents_by_topic(pinecone_index, question, topic_folder)
+            )
+        else:
+            logger.debug("🔄 STEP 1: translating to Urdu for retrieval")
             translation_result = await translate_query_for_retrieval(question)
-            urdu_query = translation_result.get('urdu_query', '')
-            print(f"   ✅ Translation: '{urdu_query}'")
+        urdu_query = translation_result.get('urdu_query', '')
+        logger.debug("✅ Translation: '%s'", urdu_query)
+        
+        if DUAL_RETRIEVAL_ENABLED:
+            # Urdu results first: they match the Urdu-heavy corpus best
+            logger.debug("🔍 STEP 2: Urdu retrieval merged with the original question's results")
+            urdu_documents = await search_documents_by_topic(pinecone_index, urdu_query, topic_folder)
+            documents = _merge_documents(urdu_documents, original_documents)
+        elif (original_documents is not None
+              and max((doc["score"] for doc in original_documents), default=0.0) >= ORIGINAL_QUERY_MIN_SCORE):
+            logger.debug("⚡ Original question matched strongly; skipping Urdu retrieval")
+            documents = original_documents
         else:
-            print(f"\n⚡ STEP 1: NO TRANSLATION NEEDED")
-            print(f"   🎯 Query is already in Urdu/Arabic")
-            urdu_query = question  # Use original query
-            translation_result = {
-                "translations": "Not needed - query already in target language",
-                "urdu_query": urdu_query
-            }
+            # RETRIEVAL: the Urdu query matches the Urdu-heavy corpus best
+            logger.debug("🔍 STEP 2: Urdu document retrieval")
+            documents = await search_documents_by_topic(pinecone_index, urdu_query, topic_folder)
+        context = prepare_context_from_documents_with_attribution(documents)
+    else:
+        logger.debug("⚡ STEP 1: no translation needed, query is already in Urdu/Arabic")
+        urdu_query = question  # Use original query
+        translation_result = {
+            "translations": "Not needed - query already in target language",
+            "urdu_query": urdu_query
+        }
         
         # RETRIEVAL: Get relevant documents with topic filtering
-        print(f"\n🔍 STEP 2: OPTIMIZED DOCUMENT RETRIEVAL")
-        print(f"   📂 Topic filter applied: {topic_folder or 'None (All Topics)'}")
-        print(f"   ⚡ Using single query with top_k=3 for speed")
-        
-        # Use the Urdu query for retrieval (either translated or original)
-        context = await get_relevant_documents_by_topic(
-            pinecone_index, 
-            urdu_query,  # Always use Urdu for retrieval
-            topic_folder
-        )
-        
-        print(f"\n📚 RETRIEVAL RESULTS:")
-        print(f"   📊 Context length: {len(context)} characters")
-        print(f"   📄 Context word count: ~{len(context.split())} words")
+        logger.debug("🔍 STEP 2: document retrieval (topic: %s, top_k=3)", topic_folder or "All Topics")
+        documents = await search_documents_by_topic(pinecone_index, urdu_query, topic_folder)
+        context = prepare_context_from_documents_with_attribution(documents)
+    
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("📚 Retrieved context: %d characters", len(context))
+    
+    return {
+        "urdu_query": urdu_query,
+        "translations": translation_result["translations"],
+        "context": context,
+        "sources_count": _count_sources(documents)
+    }
+
+def has_sufficient_context(context: str) -> bool:
+    """Whether retrieval returned enough context to answer from."""
+    return bool(context) and len(context.strip()) >= 50
+
+def insufficient_context_answer(topic_folder: str = None) -> str:
+    """Answer shown when retrieval found nothing usable."""
+    return f"Sorry, I couldn't find relevant information in the knowledge base for this specific question{' in the selected topic' if topic_folder and topic_folder != 'all' else ''}."
+
+def _response(answer: str, topic_name: Optional[str], start_time: Optional[float], **metadata: Any) -> Dict[str, Any]:
+    """Build the response dict every process_question_with_topic branch returns."""
+    processing_time = time.monotonic() - start_time if start_time is not None else 0
+    return {
+        "answer": answer,
+        "topic_name": topic_name,
+        "metadata": {"processing_time": processing_time, **metadata}
+    }
+
+async def process_question_with_topic(pinecone_index: Any, question: str, topic_folder: str = None) -> Dict[str, Any]:
+    """Main function: Process question with topic filtering - exactly 2 LLM calls."""
+    start_time = time.monotonic()  # Elapsed-time clock; no wall-clock lookup needed
+    
+    # Skip the LLM and Pinecone calls for input that can't retrieve anything useful
+    if is_rejectable_question(question):
+        logger.info("⚠️ Rejected question without enough content: '%s'", question)
+        return _response(REJECTED_QUESTION_ANSWER, None, None, topic_filter=topic_folder, rejected=True)
+    
+    cache_key = (question.strip().casefold(), topic_folder or "")
+    cached = _response_cache.get(cache_key)
+    if cached is not None and time.monotonic() - cached[0] < RESPONSE_CACHE_TTL:
+        _response_cache.move_to_end(cache_key)
+        logger.info("⚡ Response cache hit for: '%s'", question)
+        result = copy.deepcopy(cached[1])
+        result["metadata"]["processing_time"] = 0
+        result["metadata"]["cached"] = True
+        return result
+    
+    try:
+        logger.info("🤖 Processing question (topic: %s): '%s'", topic_folder or "All Topics", question)
         
-        # Count sources in context
-        source_count = context.count("[Source ")
-        print(f"   🔗 Number of sources: {source_count}")
+        use_fused = FUSED_QA_ENABLED and should_translate_question(question)
         
-        # Show context preview
-        if len(context) > 300:
-            print(f"   📖 Context preview: {context[:300]}...")
+        # Start retrieval (and translation) right away so the semantic cache lookup below
+        # doesn't add an embedding round trip in front of it; a cache hit cancels it
+        if use_fused:
+            # Retrieve with the original question; translation happens inside the answer call
+            logger.debug("⚡ STEP 1: fused mode, retrieving with the original question")
+            retrieval_task = asyncio.create_task(search_documents_by_topic(pinecone_index, question, topic_folder))
         else:
-            print(f"   📖 Full context: {context}")
+            retrieval_task = asyncio.create_task(retrieve_context_for_question(pinecone_index, question, topic_folder))
+        
+        # Paraphrases of an earlier question skip the QA call. The key is the original
+        # question's embedding (memoized by the retriever), never its Urdu translation,
+        # and only entries with the same topic, question language and answer mode can match
+        try:
+            question_vector = await embed_query_vector(question)
+            similar = _semantic_cache_lookup(question_vector, _semantic_scope(topic_folder, question, use_fused))
+        except Exception as e:
+            logger.warning("⚠️ Semantic cache lookup skipped: %s", e)
+            question_vector = similar = None
+        if similar is not None:
+            retrieval_task.cancel()
+            logger.info("⚡ Semantic cache hit for question: '%s'", question)
+            result = copy.deepcopy(similar)
+            result["metadata"]["processing_time"] = time.monotonic() - start_time
+            result["metadata"]["cached"] = "semantic"
+            return result
+        
+        if use_fused:
+            documents = await retrieval_task
+            context = prepare_context_from_documents_with_attribution(documents)
+            source_count = _count_sources(documents)
+            urdu_query = question
+            translations = "Fused into the answer call"
+            use_fused = has_sufficient_context(context)
+            if not use_fused:
+                # Fused retrieval came up short; fall back to the translated retrieval
+                retrieval_task = asyncio.create_task(retrieve_context_for_question(pinecone_index, question, topic_folder))
+        
+        if not use_fused:
+            retrieval = await retrieval_task
+            urdu_query = retrieval["urdu_query"]
+            translations = retrieval["translations"]
+            context = retrieval["context"]
+            source_count = retrieval["sources_count"]
+        
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("🔗 Number of sources: %d", source_count)
+            logger.debug("📖 Context preview: %.300s", context)
         
         # Check if context is empty or too short
-        if not context or len(context.strip()) < 50:
-            print(f"\n⚠️ WARNING: INSUFFICIENT CONTEXT!")
-            print(f"   📊 Context length: {len(context)} characters")
-            print(f"   📂 Topic filter: {topic_folder or 'All Topics'}")
-            print(f"   🔍 This may indicate:")
-            if topic_folder and topic_folder != 'all':
-                print(f"      - No relevant content in the selected topic")
-                print(f"      - Topic filter too restrictive")
-            else:
-                print(f"      - No relevant content found in entire database")
-                print(f"      - Question may be outside knowledge base scope")
+        if not has_sufficient_context(context):
+            logger.warning(
+                "⚠️ Insufficient context (%d characters, topic: %s): %s",
+                len(context),
+                topic_folder or "All Topics",
+                "no relevant content in the selected topic or filter too restrictive"
+                if topic_folder and topic_folder != 'all'
+                else "no relevant content in the database or question outside knowledge base scope"
+            )
             
-            return {
-                "answer": f"Sorry, I couldn't find relevant information in the knowledge base for this specific question{' in the selected topic' if topic_folder and topic_folder != 'all' else ''}.",
-                "topic_name": None,
-                "metadata": {
-                    "translations": translation_result["translations"],
-                    "processing_time": time.time() - start_time,
-                    "context_length": len(context),
-                    "topic_filter": topic_folder,
-                    "warning": "Context too short or empty"
-                }
-            }
+            return _response(
+                insufficient_context_answer(topic_folder), None, start_time,
+                translations=translations,
+                context_length=len(context),
+                topic_filter=topic_folder,
+                warning="Context too short or empty"
+            )
         
         # Extract topic name from context for response
         topic_name = extract_topic_name_from_context(context)
-        print(f"   🎯 Identified primary topic in results: {topic_name or 'Mixed topics'}")
         
         # LLM CALL: ANSWER GENERATION (only 1 LLM call when using topic filtering)
-        step_num = "2" if topic_folder and topic_folder != "all" else "3"
-        print(f"\n🤖 STEP {step_num}: ANSWER GENERATION")
-        print(f"   🤖 Starting LLM Call: Answer generation...")
-        print(f"   📊 Input context: {len(context)} characters")
-        
         # Send both original and Urdu queries to LLM for best response
-        print(f"   📝 Sending dual queries to LLM:")
-        print(f"      Original: {question}")
-        print(f"      Urdu: {urdu_query}")
-        
-        answer = await generate_answer_with_dual_question(question, urdu_query, context)
-        
-        processing_time = time.time() - start_time
-        
-        print(f"\n✅ PROCESSING COMPLETED SUCCESSFULLY!")
-        print(f"   ⏱️ Total processing time: {processing_time:.2f} seconds")
-        print(f"   📂 Primary topic: {topic_name or 'Mixed'}")
-        print(f"   📊 Answer length: {len(answer)} characters")
-        print(f"   🔗 Sources used: {source_count}")
-        print("🚀" * 50)
-        
-        return {
-            "answer": answer,
-            "topic_name": topic_name,
-            "metadata": {
-                "translations": translation_result["translations"],
-                "processing_time": processing_time,
-                "context_length": len(context),
-                "topic_filter": topic_folder,
-                "identified_topic": topic_name,
-                "sources_count": source_count
-            }
-        }
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("🎯 Identified primary topic in results: %s", topic_name or "Mixed topics")
+            logger.debug("🤖 Answer generation: %d context characters, original '%s', Urdu '%s'",
+                         len(context), question, urdu_query)
+        
+        if use_fused:
+            fused = await generate_answer_fused(question, context)
+            answer = fused["answer"]
+            if fused["urdu_question"]:
+                urdu_query = fused["urdu_question"]
+                translations = f"Urdu: {urdu_query}"
+        else:
+            answer = await generate_answer_with_dual_question(question, urdu_query, context)
+        
+        result = _response(
+            answer, topic_name, start_time,
+            translations=translations,
+            context_length=len(context),
+            topic_filter=topic_folder,
+            identified_topic=topic_name,
+            sources_count=source_count
+        )
+        logger.info("✅ Answered in %.2fs (topic: %s, %d characters, %d sources)",
+                    result["metadata"]["processing_time"], topic_name or "Mixed", len(answer), source_count)
+        if not answer.startswith(_ANSWER_ERROR_PREFIX):
+            _response_cache[cache_key] = (time.monotonic(), copy.deepcopy(result))
+            if question_vector is not None:
+                # Keyed on the mode actually used: fused mode falls back to dual on thin context
+                _semantic_cache_store(question_vector, _semantic_scope(topic_folder, question, use_fused),
+                                      copy.deepcopy(result))
+            _response_cache.move_to_end(cache_key)
+            while len(_response_cache) > RESPONSE_CACHE_MAX_ENTRIES:
+                _response_cache.popitem(last=False)
+        return result
         
     except Exception as e:
-        print(f"\n❌ ERROR IN QUESTION PROCESSING:")
-        print(f"   🔴 Error: {str(e)}")
-        print(f"   📂 Topic filter: {topic_folder}")
-        print(f"   ⏱️ Processing time: {time.time() - start_time:.2f} seconds")
-        import traceback
-        traceback.print_exc()
-        
-        return {
-            "answer": f"Sorry, an error occurred: {str(e)}",
-            "topic_name": None,
-            "metadata": {
-                "translations": "",
-                "processing_time": time.time() - start_time,
-                "topic_filter": topic_folder,
-                "error": True,
-                "error_message": str(e)
-            }
-        }
+        logger.exception("❌ Error in question processing after %.2fs (topic: %s): %s",
+                         time.monotonic() - start_time, topic_folder, e)
+        
+        return _response(
+            f"{_ANSWER_ERROR_PREFIX}: {str(e)}", None, start_time,
+            translations="",
+            topic_filter=topic_folder,
+            error=True,
+            error_message=str(e)
+        )
 
 # Backward compatibility function
 async def process_question(pinecone_index: Any, question: str) -> Dict[str, Any]:
@@ -1,6 +1,20 @@
 import os
+import sys
 import time
-from typing import List, Any, Dict, Optional
+import asyncio
+import hashlib
+import json
+import logging
+import queue
+import threading
+import sqlite3
+from collections import Counter, deque
+from itertools import islice
+import tempfile
+from functools import lru_cache, partial
+from typing import List, Any, Dict, Iterable, Iterator, Optional, Tuple
+import numpy as np
+import httpx
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_openai import OpenAIEmbeddings
 from langchain.docstore.document import Document
@@ -13,15 +27,289 @@ except ImportError:
         ServerlessSpec = pinecone.ServerlessSpec
     except ImportError:
         raise ImportError("Could not import Pinecone. Please install with: pip install pinecone-client")
+try:
+    from pinecone.exceptions import PineconeApiException
+except ImportError:
+    from pinecone.core.client.exceptions import PineconeApiException
+import openai
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential_jitter
+try:
+    import orjson  # Optional fast JSON for large embedding payloads
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+try:
+    from aiolimiter import AsyncLimiter  # Optional proactive OpenAI rate limiting
+except ImportError:
+    AsyncLimiter = None
 import concurrent.futures
+import multiprocessing
 from data_loader import IslamicKnowledgeDataLoader
 import re
-from langdetect import detect, LangDetectException
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Short metadata values repeated on every chunk; interned so each chunk's
+# metadata dict points at one shared string object instead of a fresh copy
+_INTERNED_METADATA_KEYS = ("category", "content_type", "priority", "language", "topic_folder", "topic_name", "chunk_type")
+
+# Arabic, Arabic Supplement/Extended-A and presentation-form ranges (covers Urdu)
+_AR_UR_RANGES = ((0x0600, 0x06FF), (0x0750, 0x077F), (0x08A0, 0x08FF), (0xFB50, 0xFDFF), (0xFE70, 0xFEFF))
+_AR_UR_RE = re.compile(r'[\u0600-\u06FF\u0750-\u077F\u08A0-\u08FF\uFB50-\uFDFF\uFE70-\uFEFF]')
+_SECTION_RE = re.compile(r'={20,}')
+_VERSE_RE = re.compile(r'VERSE \d+:')
+_PARA_RE = re.compile(r'\n\n+')
+_TOPIC_PREFIX_RE = re.compile(r'^\d+_')  # Numbered topic folders like "03_Hadith_Mawdat_ul_Qurba"
+_NUMPY_MIN_LENGTH = 256  # Below this the regex is cheaper than NumPy setup
+_END_OF_CHUNKS = object()  # Queue sentinel marking the end of chunk production
+_BATCH_API_MAX_REQUESTS = 50_000  # OpenAI Batch API limit on requests per input file
+_SQLITE_MAX_KEYS_PER_QUERY = 500  # Stays under SQLite's bound-variable limit (999 on older builds)
+_EMBEDDING_ENCODING = "cl100k_base"  # tiktoken encoding shared by the OpenAI embedding models
+
+# Full output size of the OpenAI embedding models, used when EMBEDDING_DIMENSIONS is unset
+_NATIVE_EMBEDDING_DIMENSIONS = {
+    "text-embedding-3-large": 3072,
+    "text-embedding-3-small": 1536,
+    "text-embedding-ada-002": 1536,
+}
+
+# Errors worth retrying a whole batch for: rate limits, timeouts and server-side hiccups
+_TRANSIENT_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+def _is_transient_error(error: BaseException) -> bool:
+    """Retry transient OpenAI errors and Pinecone 429/5xx; permanent 4xx (400, 401, ...) fail fast."""
+    if isinstance(error, PineconeApiException):
+        status = getattr(error, "status", None) or 0
+        return status == 429 or status >= 500
+    return isinstance(error, _TRANSIENT_ERRORS)
+
+_MAX_RETRY_AFTER = 60.0  # Seconds; caps a server-supplied Retry-After
+_batch_backoff = wait_exponential_jitter(initial=1, max=30)
+
+def _wait_retry_after(retry_state) -> float:
+    """Wait as long as the failed call's Retry-After header asks, else back off exponentially."""
+    error = retry_state.outcome.exception()
+    # openai errors carry an httpx response; PineconeApiException exposes headers directly
+    headers = getattr(getattr(error, "response", None), "headers", None) or getattr(error, "headers", None)
+    try:
+        return min(float(headers.get("retry-after")), _MAX_RETRY_AFTER)
+    except (AttributeError, TypeError, ValueError):
+        return _batch_backoff(retry_state)
+
+# Metadata flattening: value types Pinecone stores as-is, and nested keys always stringified
+_SIMPLE_TYPES = frozenset({str, int, float, bool})
+_COMPLEX_METADATA_KEYS = frozenset({'mobile_navigation', 'related_content', 'navigation_path'})
+
+def _embedding_cache_namespace(model: str, dimensions: Optional[int]) -> str:
+    """Cache namespace for a model; truncated vectors get their own entries."""
+    return f"{model}:{dimensions}" if dimensions else model
+
+def _encode_vector(vector: List[float]) -> bytes:
+    """Pack an embedding as float16 bytes for the on-disk cache."""
+    return np.asarray(vector, dtype=np.float16).tobytes()
+
+def _decode_vector(blob: bytes) -> List[float]:
+    """Unpack a float16 cache blob back to the float32 list Pinecone expects."""
+    return np.frombuffer(blob, dtype=np.float16).astype(np.float32).tolist()
+
+def _arabic_ratio_np(text: str) -> float:
+    """Fraction of Arabic/Urdu code points, classified with vectorized NumPy compares."""
+    if not text:
+        return 0.0
+    if len(text) < _NUMPY_MIN_LENGTH:
+        # Deleting the matches counts them without building a list of one-character strings
+        return (len(text) - len(_AR_UR_RE.sub('', text))) / len(text)
+    code_points = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+    mask = np.zeros(code_points.shape, dtype=bool)
+    for low, high in _AR_UR_RANGES:
+        mask |= (code_points >= low) & (code_points <= high)
+    return float(mask.mean())
+
+def _is_arabic_urdu_text(text: str) -> bool:
+    """Check if more than 15% of the text is Arabic/Urdu script."""
+    return _arabic_ratio_np(text) > 0.15
+
+# Splitting helpers live at module level so ProcessPoolExecutor workers can pickle them
+
+def _flatten_metadata_for_pinecone(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """Flatten complex metadata to Pinecone-compatible format."""
+    flattened = {}
+    
+    for key, value in metadata.items():
+        value_type = type(value)
+        if value_type in _SIMPLE_TYPES:
+            # Simple types - keep as is
+            flattened[key] = value
+        elif value_type is list:
+            # Lists - convert to strings if they contain complex objects
+            if all(type(item) in _SIMPLE_TYPES for item in value):
+                flattened[key] = value
+            else:
+                flattened[key] = str(value)
+        elif value_type is dict:
+            if key in _COMPLEX_METADATA_KEYS:
+                # Convert complex nested objects to strings
+                flattened[key] = str(value)
+            else:
+                # Flatten simple nested objects
+                for nested_key, nested_value in value.items():
+                    flat_key = f"{key}_{nested_key}"
+                    flattened[flat_key] = nested_value if type(nested_value) in _SIMPLE_TYPES else str(nested_value)
+        else:
+            # Other types - convert to string
+            flattened[key] = str(value)
+    
+    return flattened
+
+def _intern_metadata(metadata: Dict[str, Any]) -> None:
+    """Intern the repeated category-level metadata values in place."""
+    for key in _INTERNED_METADATA_KEYS:
+        value = metadata.get(key)
+        if isinstance(value, str):
+            metadata[key] = sys.intern(value)
+
+def _split_document_language_aware(document: Document, chunk_size: int, chunk_tokens: int, chunk_overlap_tokens: int) -> List[Document]:
+    """Split document with language-aware chunking."""
+    content = document.page_content
+    # Flatten once per document; the per-chunk fields added below are already simple types
+    metadata = _flatten_metadata_for_pinecone(document.metadata)
+    
+    # Detect if content contains Arabic/Urdu text (once per document)
+    is_arabic_urdu = _is_arabic_urdu_text(content)
+    chunk_type = "arabic_urdu" if is_arabic_urdu else "standard"
+    if is_arabic_urdu:
+        chunks = _split_arabic_urdu_content(content, chunk_size)
+    else:
+        chunks = _split_standard_content(content, chunk_tokens, chunk_overlap_tokens)
+    
+    # Create chunk documents with enhanced metadata
+    chunk_documents = []
+    total_chunks = len(chunks)
+    for i, chunk in enumerate(chunks):
+        # Chunks inherit the document's classification; only unusually large
+        # ones (e.g. a single unbroken paragraph) are worth rescanning
+        if len(chunk) > 4 * chunk_size:
+            this_chunk_type = "arabic_urdu" if _is_arabic_urdu_text(chunk) else "standard"
+        else:
+            this_chunk_type = chunk_type
+        
+        chunk_metadata = {
+            **metadata,
+            "chunk_index": i,
+            "total_chunks": total_chunks,
+            "chunk_size": len(chunk),
+            "chunk_type": this_chunk_type
+        }
+        
+        chunk_doc = Document(
+            page_content=chunk,
+            metadata=chunk_metadata
+        )
+        chunk_documents.append(chunk_doc)
+    
+    return chunk_documents
+
+def _split_arabic_urdu_content(content: str, chunk_size: int) -> List[str]:
+    """Split Arabic/Urdu content while preserving structure."""
+    chunks = _iter_arabic_urdu_pieces(content)
+    
+    # Merge small chunks up to chunk_size, joining each buffer once on flush
+    final_chunks = []
+    buffer = []
+    buffer_len = 0
+    
+    for chunk in chunks:
+        new_len = buffer_len + len(chunk) + (2 if buffer else 0)  # 2 for "\n\n"
+        if new_len <= chunk_size:
+            buffer.append(chunk)
+            buffer_len = new_len
+        else:
+            if buffer:
+                final_chunks.append("\n\n".join(buffer))
+            buffer = [chunk]
+            buffer_len = len(chunk)
+    
+    if buffer:
+        final_chunks.append("\n\n".join(buffer))
+    
+    return final_chunks
+
+def _iter_arabic_urdu_pieces(content: str) -> Iterator[str]:
+    """Yield trimmed verse/paragraph pieces longer than 50 characters."""
+    # Split by major section breaks first
+    for section in _SECTION_RE.split(content):
+        if not section.strip():
+            continue
+        
+        # Split by verse markers (for Quran), otherwise by natural paragraph breaks
+        splitter = _VERSE_RE if 'VERSE' in section else _PARA_RE
+        for piece in splitter.split(section):
+            piece = piece.strip()
+            if len(piece) > 50:
+                yield piece
+
+@lru_cache(maxsize=None)
+def _get_standard_splitter(chunk_tokens: int, chunk_overlap_tokens: int) -> RecursiveCharacterTextSplitter:
+    """Build the token-sized standard splitter once per configuration (and per worker process)."""
+    # Measure chunks in tokens of the embedding models' encoding, since that is
+    # what OpenAI bills and limits on; characters overcount for English text
+    return RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+        encoding_name=_EMBEDDING_ENCODING,
+        chunk_size=chunk_tokens,
+        chunk_overlap=chunk_overlap_tokens,
+        separators=["\n\n", "\n", ". ", "! ", "? ", " ", ""]
+    )
+
+def _split_standard_content(content: str, chunk_tokens: int, chunk_overlap_tokens: int) -> List[str]:
+    """Split standard content using RecursiveCharacterTextSplitter."""
+    return _get_standard_splitter(chunk_tokens, chunk_overlap_tokens).split_text(content)
+
+# Path-derived metadata is a pure function of the path, so memoize it for
+# incremental rebuilds and retries that see the same files again
+
+def _find_topic_folder(path_parts: List[str]) -> Optional[str]:
+    """Return the first numbered topic folder in a split directory path."""
+    for part in path_parts:
+        if _TOPIC_PREFIX_RE.match(part):  # Find numbered folder like "03_Hadith_Mawdat_ul_Qurba"
+            return part
+    return None
+
+@lru_cache(maxsize=None)
+def _clean_topic_name(folder_name: str) -> str:
+    """Keep original folder names as topic names, just remove number prefix and replace underscores."""
+    # Remove number prefix (e.g., "03_" -> "") and replace underscores with spaces
+    return sys.intern(_TOPIC_PREFIX_RE.sub('', folder_name).replace('_', ' '))
+
+@lru_cache(maxsize=None)
+def _generate_source_url(file_path: str) -> str:
+    """Generate a source URL for answer attribution."""
+    filename = os.path.basename(file_path)
+    topic_folder = _find_topic_folder(os.path.dirname(file_path).split(os.sep)) or "general"
+    
+    # Create a clean URL-like path
+    base_url = "islamic-knowledge"
+    clean_topic = topic_folder.lower().replace('_', '-')
+    clean_filename = filename.replace('.txt', '').replace('_', '-').lower()
+    
+    return f"{base_url}/{clean_topic}/{clean_filename}"
+
+@lru_cache(maxsize=None)
+def _topic_fields(filepath: str) -> Tuple[str, str, str]:
+    """Return (topic_folder, topic_name, source_url) for a document path."""
+    topic_folder = _find_topic_folder(os.path.dirname(filepath).split(os.sep))
+    if not topic_folder:
+        topic_folder = "18_Additional_Content"  # Default
+    return sys.intern(topic_folder), _clean_topic_name(topic_folder), _generate_source_url(filepath)
+
 class TopicBasedIslamicEmbeddingCreator:
     """Topic-based embedding creator for Islamic knowledge dataset with filtering capability."""
     
@@ -39,85 +327,76 @@ class TopicBasedIslamicEmbeddingCreator:
         if not self.pinecone_api_key:
             raise ValueError("PINECONE_API_KEY environment variable is required. Please check your .env file.")
         
-        # Use text-embedding-3-large for better multilingual support
-        self.embedding_model = "text-embedding-3-large"
-        self.embedder = OpenAIEmbeddings(
-            model=self.embedding_model, 
-            api_key=self.openai_api_key
-        )
+        # text-embedding-3-large by default for better multilingual support; EMBEDDING_DIMENSIONS
+        # truncates text-embedding-3-* vectors (the index must be recreated to match)
+        self.embedding_model = os.getenv("EMBEDDING_MODEL", "text-embedding-3-large")
+        dimensions = os.getenv("EMBEDDING_DIMENSIONS")
+        self.embedding_dimensions = int(dimensions) if dimensions else None
+        self.embedder = self._build_embedder()
+        self._async_embedder = None  # Pooled-client embedder, set while a batch run is in progress
+        # Per-instance memo for query embeddings so repeated test queries skip the API
+        self._embed_query_cached = lru_cache(maxsize=1024)(self.embedder.embed_query)
         
         # Optimized chunking parameters for Islamic content
-        self.chunk_size = 800  # Smaller chunks for better precision
-        self.chunk_overlap = 100  # Good overlap for context continuity
-        self.max_chunks_per_batch = 50  # Smaller batches for better memory management
+        self.chunk_size = 800  # Smaller chunks for better precision (characters, Arabic/Urdu splitter)
+        self.chunk_tokens = 200  # Standard splitter chunk size in embedding tokens (~800 characters)
+        self.chunk_overlap_tokens = 25  # Standard splitter overlap in embedding tokens (~100 characters)
+        self.max_chunks_per_batch = 500  # Chunks embedded per batch
+        self.upsert_batch_size = 100  # Vectors per parallel Pinecone upsert request
+        self.max_concurrent_batches = int(os.getenv("EMBEDDING_CONCURRENCY", "8"))  # Batches in flight at once
+        # Token bucket pacing embedding requests at the account's requests-per-minute
+        # limit, so bursts of concurrent batches don't run into 429s and retries
+        openai_rpm = int(os.getenv("OPENAI_RPM", "3500"))
+        self._rate_limiter = AsyncLimiter(openai_rpm, 60) if AsyncLimiter and openai_rpm > 0 else None
         
         # Pinecone configuration - NEW INDEX NAME
         self.pinecone = Pinecone(api_key=self.pinecone_api_key)
         self.index_name = "islamic-knowledge-topics-v2"  # New index name
+        self.index = None  # Index handle, resolved once and reused for every batch
+        
+        # On-disk embedding cache so unchanged chunks are not re-embedded on later runs
+        self.embedding_cache_path = os.getenv("EMBEDDING_CACHE_PATH", ".embedding_cache.db")
+        self._embedding_cache = None
+        
+        # Batches that still fail after retries are logged here for re-processing
+        self.dead_letter_path = os.getenv("DEAD_LETTER_PATH", "failed_batches.jsonl")
+        
+        # Full rebuilds can embed through the OpenAI Batch API (half price, no RPM pressure)
+        self.use_batch_api = os.getenv("EMBEDDING_BATCH_API", "").lower() in ("1", "true", "yes")
+        
+        # Optionally store each topic folder in its own Pinecone namespace, so topic
+        # searches and topic listing need no metadata filtering (must match the retriever)
+        self.use_topic_namespaces = os.getenv("TOPIC_NAMESPACES", "").lower() in ("1", "true", "yes")
         
         print(f"[TopicBasedEmbeddingCreator] Initialized with:")
         print(f"  - OpenAI Model: {self.embedding_model}")
+        print(f"  - Embedding Dimensions: {self.embedding_dimensions or 'model default'}")
         print(f"  - Pinecone Index: {self.index_name}")
         print(f"  - Chunk Size: {self.chunk_size}")
-        print(f"  - Chunk Overlap: {self.chunk_overlap}")
+        print(f"  - Standard Chunk Tokens: {self.chunk_tokens} (overlap {self.chunk_overlap_tokens})")
+    
+    def _build_embedder(self, http_async_client: Optional[httpx.AsyncClient] = None, max_retries: int = 6) -> OpenAIEmbeddings:
+        """Create the OpenAI embedder, optionally on a shared async HTTP connection pool."""
+        return OpenAIEmbeddings(
+            model=self.embedding_model, 
+            dimensions=self.embedding_dimensions,
+            api_key=self.openai_api_key,
+            max_retries=max_retries,  # Exponential backoff on 429s instead of fixed sleeps
+            http_async_client=http_async_client
+        )
     
     def clean_topic_name(self, folder_name: str) -> str:
         """Keep original folder names as topic names, just remove number prefix and replace underscores."""
-        # Remove number prefix (e.g., "03_" -> "")
-        cleaned = re.sub(r'^\d+_', '', folder_name)
-        
-        # Replace underscores with spaces
-        cleaned = cleaned.replace('_', ' ')
-        
-        # Keep the original names as they are
-        return cleaned
+        return _clean_topic_name(folder_name)
     
     def generate_source_url(self, file_path: str, topic_name: str) -> str:
         """Generate a source URL for answer attribution."""
-        # Clean the file path
-        filename = os.path.basename(file_path)
-        directory = os.path.dirname(file_path)
-        
-        # Extract topic folder
-        path_parts = directory.split(os.sep)
-        topic_folder = None
-        for part in path_parts:
-            if re.match(r'^\d+_', part):  # Find numbered folder
-                topic_folder = part
-                break
-        
-        if not topic_folder:
-            topic_folder = "general"
-        
-        # Create a clean URL-like path
-        base_url = "islamic-knowledge"
-        clean_topic = topic_folder.lower().replace('_', '-')
-        clean_filename = filename.replace('.txt', '').replace('_', '-').lower()
-        
-        source_url = f"{base_url}/{clean_topic}/{clean_filename}"
-        return source_url
+        return _generate_source_url(file_path)
     
     def extract_enhanced_metadata(self, filepath: str, existing_metadata: Dict[str, Any]) -> Dict[str, Any]:
         """Extract enhanced metadata including topic_name and source_url."""
-        # Get the directory path to determine topic
-        directory = os.path.dirname(filepath)
-        path_parts = directory.split(os.sep)
-        
-        # Find the main topic folder (numbered folder)
-        topic_folder = None
-        for part in path_parts:
-            if re.match(r'^\d+_', part):  # Find numbered folder like "03_Hadith_Mawdat_ul_Qurba"
-                topic_folder = part
-                break
-        
-        if not topic_folder:
-            topic_folder = "18_Additional_Content"  # Default
-        
-        # Clean topic name for user display
-        topic_name = self.clean_topic_name(topic_folder)
-        
-        # Generate source URL
-        source_url = self.generate_source_url(filepath, topic_name)
+        # Path-derived fields are memoized per file path
+        topic_folder, topic_name, source_url = _topic_fields(filepath)
         
         # Add new metadata fields to existing metadata
         enhanced_metadata = existing_metadata.copy()
@@ -129,6 +408,9 @@ class TopicBasedIslamicEmbeddingCreator:
             "supports_topic_filtering": True
         })
         
+        # Intern category-level strings shared by many documents
+        _intern_metadata(enhanced_metadata)
+        
         return enhanced_metadata
     
     def create_index_from_data_directory(self, data_directory: str = "data_as_txt", progress_cb = None) -> Any:
@@ -164,22 +446,15 @@ class TopicBasedIslamicEmbeddingCreator:
         if progress_cb:
             progress_cb(20)
         
-        # Create chunks with enhanced splitting
-        print("[TopicBasedEmbeddingCreator] Creating chunks...")
-        chunks = self._create_enhanced_chunks(documents)
-        
-        print(f"[TopicBasedEmbeddingCreator] Created {len(chunks)} chunks")
-        if progress_cb:
-            progress_cb(30)
-        
-        # Get topic statistics
-        topic_stats = self._get_topic_statistics(chunks)
-        print(f"[TopicBasedEmbeddingCreator] Topic distribution:")
-        for topic, count in topic_stats.items():
-            print(f"  - {topic}: {count} chunks")
-        
-        if progress_cb:
-            progress_cb(35)
+        # Stream chunks from the splitter workers straight into embedding batches
+        print("[TopicBasedEmbeddingCreator] Chunking documents...")
+        chunks = self._iter_enhanced_chunks(documents)
+        if self.use_batch_api:
+            # Embed everything offline before touching the live index: the Batch API job can
+            # take hours (or fail), and the old index keeps serving until every vector is cached.
+            # The batch pipeline then finds every text in the embedding cache and only upserts.
+            chunks = list(chunks)
+            self._embed_with_batch_api([chunk.page_content for chunk in chunks])
         
         # Create or recreate Pinecone index
         print("[TopicBasedEmbeddingCreator] Setting up Pinecone index...")
@@ -188,9 +463,14 @@ class TopicBasedIslamicEmbeddingCreator:
         if progress_cb:
             progress_cb(40)
         
-        # Process chunks in batches
         print("[TopicBasedEmbeddingCreator] Processing chunks...")
-        self._process_chunks_in_batches(chunks, progress_cb)
+        total_chunks = self._process_chunks_in_batches(
+            chunks,
+            progress_cb,
+            total_documents=len(documents)
+        )
+        print(f"[TopicBasedEmbeddingCreator] Created and processed {total_chunks} chunks")
+        self._invalidate_retrieval_caches()
         
         total_time = time.time() - start_time
         print(f"[TopicBasedEmbeddingCreator] Topic-based index creation completed in {total_time:.2f} seconds")
@@ -202,10 +482,7 @@ class TopicBasedIslamicEmbeddingCreator:
     
     def _get_topic_statistics(self, chunks: List[Document]) -> Dict[str, int]:
         """Get statistics about topic distribution in chunks."""
-        topic_counts = {}
-        for chunk in chunks:
-            topic_name = chunk.metadata.get('topic_name', 'Unknown')
-            topic_counts[topic_name] = topic_counts.get(topic_name, 0) + 1
+        topic_counts = Counter(chunk.metadata.get('topic_name', 'Unknown') for chunk in chunks)
         return dict(sorted(topic_counts.items()))
     
     def get_available_topics(self, data_directory: str = "data_as_txt") -> List[Dict[str, str]]:
@@ -220,14 +497,16 @@ class TopicBasedIslamicEmbeddingCreator:
         })
         
         # Walk through data directory to find topic folders
-        for item in os.listdir(data_directory):
-            item_path = os.path.join(data_directory, item)
-            if os.path.isdir(item_path) and re.match(r'^\d+_', item):
-                topics.append({
-                    "folder_name": item,
-                    "display_name": self.clean_topic_name(item),
-                    "description": f"Content from {self.clean_topic_name(item)}"
-                })
+        # (scandir entries reuse the directory listing for is_dir, no extra stat per entry)
+        with os.scandir(data_directory) as entries:
+            for entry in entries:
+                if entry.is_dir() and _TOPIC_PREFIX_RE.match(entry.name):
+                    display_name = self.clean_topic_name(entry.name)
+                    topics.append({
+                        "folder_name": entry.name,
+                        "display_name": display_name,
+                        "description": f"Content from {display_name}"
+                    })
         
         return topics
     
@@ -245,122 +524,75 @@ class TopicBasedIslamicEmbeddingCreator:
         
         if not new_documents:
             print("No new documents found to add")
-            return self.pinecone.Index(self.index_name)
+            return self._get_index()
         
         # Enhance metadata
         for doc in new_documents:
             doc.metadata = self.extract_enhanced_metadata(doc.metadata['file_path'], doc.metadata)
         
-        # Create chunks
-        new_chunks = self._create_enhanced_chunks(new_documents)
-        print(f"[TopicBasedEmbeddingCreator] Created {len(new_chunks)} new chunks")
-        
         # Get current index stats to determine starting ID
-        index = self.pinecone.Index(self.index_name)
+        index = self._get_index()
         stats = index.describe_index_stats()
         current_count = stats.total_vector_count
         
-        # Process new chunks starting from current count
-        self._process_chunks_in_batches(new_chunks, progress_cb, starting_id=current_count)
+        # Chunk and process new documents starting from current count
+        new_chunk_count = self._process_chunks_in_batches(
+            self._iter_enhanced_chunks(new_documents),
+            progress_cb,
+            starting_id=current_count,
+            total_documents=len(new_documents)
+        )
         
-        print(f"[TopicBasedEmbeddingCreator] Successfully added {len(new_chunks)} new chunks to index")
+        print(f"[TopicBasedEmbeddingCreator] Successfully added {new_chunk_count} new chunks to index")
+        self._invalidate_retrieval_caches()
         return index
     
-    def _create_enhanced_chunks(self, documents: List[Document]) -> List[Document]:
-        """Create enhanced chunks with language-aware splitting."""
-        all_chunks = []
-        
-        for doc in documents:
-            # Use language-specific splitting
-            chunks = self._split_document_language_aware(doc)
-            all_chunks.extend(chunks)
-        
-        return all_chunks
+    def _invalidate_retrieval_caches(self) -> None:
+        """Drop cached search results and topics now that the index contents changed."""
+        # Imported lazily: the retriever builds its own OpenAI client at import time.
+        # Other processes (API, UI) still expire their entries through SEARCH_CACHE_TTL
+        # and TOPICS_CACHE_TTL; deleting the topics sidecar makes their next refresh rescan.
+        from topic_based_retriever import clear_search_cache, clear_topics_cache
+        clear_search_cache()
+        clear_topics_cache()
     
-    def _split_document_language_aware(self, document: Document) -> List[Document]:
-        """Split document with language-aware chunking."""
-        content = document.page_content
-        metadata = document.metadata.copy()
-        
-        # Detect if content contains Arabic/Urdu text
-        if self._is_arabic_urdu_content(content):
-            chunks = self._split_arabic_urdu_content(content)
-        else:
-            chunks = self._split_standard_content(content)
-        
-        # Create chunk documents with enhanced metadata
-        chunk_documents = []
-        for i, chunk in enumerate(chunks):
-            chunk_metadata = metadata.copy()
-            chunk_metadata.update({
-                "chunk_index": i,
-                "total_chunks": len(chunks),
-                "chunk_size": len(chunk),
-                "chunk_type": "arabic_urdu" if self._is_arabic_urdu_content(chunk) else "standard"
-            })
-            
-            chunk_doc = Document(
-                page_content=chunk,
-                metadata=chunk_metadata
-            )
-            chunk_documents.append(chunk_doc)
-        
-        return chunk_documents
+    def _iter_enhanced_chunks(self, documents: List[Document]) -> Iterator[Document]:
+        """Yield enhanced chunks as worker processes finish splitting each document."""
+        # Splitting is CPU-bound regex/string work, so fan documents out to processes
+        split = partial(
+            _split_document_language_aware,
+            chunk_size=self.chunk_size,
+            chunk_tokens=self.chunk_tokens,
+            chunk_overlap_tokens=self.chunk_overlap_tokens
+        )
+        # Keep only a small window of documents in flight (rather than executor.map, which
+        # submits everything up front), so finished splits never pile up ahead of the embedder
+        max_workers = os.cpu_count() or 1
+        # Never fork: this runs in a worker thread next to the event loop and the HTTP pools,
+        # and a forked child can deadlock on a lock another thread held at fork time
+        executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+        try:
+            remaining = iter(documents)
+            in_flight = deque(executor.submit(split, doc) for doc in islice(remaining, 2 * max_workers))
+            while in_flight:
+                chunks = in_flight.popleft().result()
+                next_document = next(remaining, None)
+                if next_document is not None:
+                    in_flight.append(executor.submit(split, next_document))
+                for chunk in chunks:
+                    # Unpickled metadata strings are fresh copies; intern them here in the parent
+                    _intern_metadata(chunk.metadata)
+                    yield chunk
+        finally:
+            # Drop splits nobody will consume if the caller stops early
+            executor.shutdown(wait=True, cancel_futures=True)
     
     def _is_arabic_urdu_content(self, text: str) -> bool:
         """Check if text contains significant Arabic/Urdu content."""
-        arabic_urdu_chars = re.findall(r'[\u0600-\u06FF\u0750-\u077F\u08A0-\u08FF\uFB50-\uFDFF\uFE70-\uFEFF]', text)
-        return len(arabic_urdu_chars) > len(text) * 0.15  # 15% threshold
-    
-    def _split_arabic_urdu_content(self, content: str) -> List[str]:
-        """Split Arabic/Urdu content while preserving structure."""
-        chunks = []
-        
-        # Split by major section breaks first
-        sections = re.split(r'={20,}', content)
-        
-        for section in sections:
-            if not section.strip():
-                continue
-            
-            # Split by verse markers (for Quran)
-            if 'VERSE' in section:
-                verses = re.split(r'VERSE \d+:', section)
-                for verse in verses:
-                    if len(verse.strip()) > 50:
-                        chunks.append(verse.strip())
-            else:
-                # Split by natural paragraph breaks
-                paragraphs = re.split(r'\n\n+', section)
-                for para in paragraphs:
-                    if len(para.strip()) > 50:
-                        chunks.append(para.strip())
-        
-        # Merge small chunks and split large ones
-        final_chunks = []
-        current_chunk = ""
-        
-        for chunk in chunks:
-            if len(current_chunk) + len(chunk) <= self.chunk_size:
-                current_chunk += "\n\n" + chunk if current_chunk else chunk
-            else:
-                if current_chunk:
-                    final_chunks.append(current_chunk)
-                current_chunk = chunk
-        
-        if current_chunk:
-            final_chunks.append(current_chunk)
-        
-        return final_chunks
-    
-    def _split_standard_content(self, content: str) -> List[str]:
-        """Split standard content using RecursiveCharacterTextSplitter."""
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=self.chunk_size,
-            chunk_overlap=self.chunk_overlap,
-            separators=["\n\n", "\n", ". ", "! ", "? ", " ", ""]
-        )
-        return splitter.split_text(content)
+        return _is_arabic_urdu_text(text)  # 15% threshold
     
     def _setup_pinecone_index(self) -> Any:
         """Setup Pinecone index with optimal configuration."""
@@ -380,134 +612,387 @@ class TopicBasedIslamicEmbeddingCreator:
         
         self.pinecone.create_index(
             name=self.index_name,
-            dimension=3072,  # text-embedding-3-large dimension
+            dimension=self.embedding_dimensions or _NATIVE_EMBEDDING_DIMENSIONS.get(self.embedding_model, 3072),
             metric="cosine",
             spec=ServerlessSpec(cloud=cloud, region=region),
         )
         
         # Wait for index to be ready
         print("[TopicBasedEmbeddingCreator] Waiting for index to be ready...")
-        time.sleep(10)
+        self._wait_for_index_ready()
         
-        return self.pinecone.Index(self.index_name)
+        self.index = self.pinecone.Index(self.index_name, pool_threads=30)
+        return self.index
+    
+    def _wait_for_index_ready(self, timeout: float = 30.0) -> None:
+        """Poll describe_index with exponential backoff until the index reports ready."""
+        deadline = time.monotonic() + timeout
+        delay = 0.5
+        while True:
+            status = self.pinecone.describe_index(self.index_name).status
+            ready = status.get("ready") if isinstance(status, dict) else getattr(status, "ready", False)
+            if ready:
+                print("[TopicBasedEmbeddingCreator] Index is ready")
+                return
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"Index {self.index_name} was not ready after {timeout:.0f} seconds")
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, 8)
+    
+    def _get_index(self) -> Any:
+        """Return the cached index handle, resolving it on first use."""
+        if self.index is None:
+            self.index = self.pinecone.Index(self.index_name, pool_threads=30)
+        return self.index
+    
+    def _process_chunks_in_batches(self, chunks: Iterable[Document], progress_cb = None, starting_id: int = 0, total_documents: int = 0) -> int:
+        """Stream chunks into concurrent embedding batches (synchronous entry point)."""
+        return asyncio.run(self._process_chunks_with_http_pool(chunks, progress_cb, starting_id, total_documents))
     
-    def _process_chunks_in_batches(self, chunks: List[Document], progress_cb = None, starting_id: int = 0) -> None:
-        """Process chunks in batches for better memory management."""
-        total_chunks = len(chunks)
+    async def _process_chunks_with_http_pool(self, chunks: Iterable[Document], progress_cb = None, starting_id: int = 0, total_documents: int = 0) -> int:
+        """Run the batch pipeline with one pooled httpx client shared by every embedding call."""
+        # Created inside the running loop (httpx connections are bound to it) and reused
+        # across batches so concurrent requests share keep-alive TLS connections
+        limits = httpx.Limits(max_connections=64, max_keepalive_connections=32)
+        async with httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(120.0)) as http_client:
+            # _process_batch already retries transient errors (honouring Retry-After), so the
+            # client must not retry too or one batch could make up to 5 x 7 requests
+            self._async_embedder = self._build_embedder(http_client, max_retries=0)
+            try:
+                return await self._process_chunks_in_batches_async(chunks, progress_cb, starting_id, total_documents)
+            finally:
+                self._async_embedder = None
+    
+    async def _process_chunks_in_batches_async(self, chunks: Iterable[Document], progress_cb = None, starting_id: int = 0, total_documents: int = 0) -> int:
+        """Embed and upsert batches as chunks are produced, bounded by a semaphore."""
+        # Bounded queue holds at most a couple of batches between the producer thread and the embedder
+        chunk_queue = queue.Queue(maxsize=2 * self.max_chunks_per_batch)
+        stop_producing = threading.Event()
+        semaphore = asyncio.Semaphore(self.max_concurrent_batches)
         processed = 0
-        
-        # Process in smaller batches
-        for i in range(0, total_chunks, self.max_chunks_per_batch):
-            batch = chunks[i:i + self.max_chunks_per_batch]
-            batch_start = i + starting_id
-            batch_end = min(i + self.max_chunks_per_batch, total_chunks) + starting_id
+        documents_done = 0
+        topic_counts = Counter()
+        # Progress runs from 40% to 95% across the documents being indexed
+        progress_per_document = 55 / total_documents if progress_cb and total_documents else 0
+        
+        def put(item) -> bool:
+            # Poll instead of blocking forever so the producer notices when the consumer has gone away
+            while not stop_producing.is_set():
+                try:
+                    chunk_queue.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+        
+        def produce() -> None:
+            try:
+                for chunk in chunks:
+                    if not put(chunk):
+                        break
+            finally:
+                if stop_producing.is_set():
+                    close = getattr(chunks, "close", None)
+                    if close is not None:
+                        close()  # Shuts down the splitting processes
+                else:
+                    put(_END_OF_CHUNKS)
+        
+        def take_batch():
+            batch = []
+            while len(batch) < self.max_chunks_per_batch:
+                chunk = chunk_queue.get()
+                if chunk is _END_OF_CHUNKS:
+                    return batch, True
+                batch.append(chunk)
+            return batch, False
+        
+        async def run_batch(batch: List[Document], batch_start: int) -> None:
+            nonlocal processed, documents_done
+            batch_end = batch_start + len(batch)
+            ids = [f"topic-chunk-{n}" for n in range(batch_start, batch_end)]
+            try:
+                await self._process_batch(batch, ids)
+            except Exception as e:
+                print(f"[TopicBasedEmbeddingCreator] Error processing batch {batch_start+1}-{batch_end}: {e}")
+                self._record_failed_batch(ids, e)
+                return
+            finally:
+                semaphore.release()
             
-            print(f"[TopicBasedEmbeddingCreator] Processing batch {batch_start+1}-{batch_end} of {total_chunks + starting_id}")
+            processed += len(batch)
+            # A document is done once its last chunk has been upserted
+            documents_done += sum(1 for doc in batch if doc.metadata["chunk_index"] == doc.metadata["total_chunks"] - 1)
             
-            try:
-                self._process_batch(batch, batch_start)
-                processed += len(batch)
-                
-                # Update progress
-                if progress_cb:
-                    progress_pct = 40 + int(55 * processed / total_chunks)
-                    progress_cb(progress_pct)
-                
-                print(f"[TopicBasedEmbeddingCreator] Processed {processed}/{total_chunks} chunks")
+            # Update progress
+            if progress_per_document:
+                progress_cb(40 + int(documents_done * progress_per_document))
+            
+            logger.info("[TopicBasedEmbeddingCreator] Processed %d chunks (%d/%d documents)", processed, documents_done, total_documents)
+        
+        producer = asyncio.create_task(asyncio.to_thread(produce))
+        tasks = []
+        batch_start = starting_id
+        finished = False
+        try:
+            while not finished:
+                batch, finished = await asyncio.to_thread(take_batch)
+                if not batch:
+                    continue
                 
-                # Small delay to avoid rate limiting
-                time.sleep(1)
+                topic_counts.update(self._get_topic_statistics(batch))
                 
-            except Exception as e:
-                print(f"[TopicBasedEmbeddingCreator] Error processing batch {batch_start+1}-{batch_end}: {e}")
-                continue
+                # Wait for a free slot before pulling more chunks off the queue
+                await semaphore.acquire()
+                logger.info("[TopicBasedEmbeddingCreator] Processing batch %d-%d", batch_start + 1, batch_start + len(batch))
+                tasks.append(asyncio.create_task(run_batch(batch, batch_start)))
+                batch_start += len(batch)
+            
+            await asyncio.gather(*tasks)
+        finally:
+            # If the consumer failed, release a producer blocked on the full queue
+            stop_producing.set()
+            while True:
+                try:
+                    chunk_queue.get_nowait()
+                except queue.Empty:
+                    break
+            await producer  # Re-raise any chunking error
+        
+        print(f"[TopicBasedEmbeddingCreator] Topic distribution:")
+        for topic, count in sorted(topic_counts.items()):
+            print(f"  - {topic}: {count} chunks")
+        
+        return processed
     
     def _flatten_metadata_for_pinecone(self, metadata: Dict[str, Any]) -> Dict[str, Any]:
         """Flatten complex metadata to Pinecone-compatible format."""
-        flattened = {}
-        
-        for key, value in metadata.items():
-            if isinstance(value, (str, int, float, bool)):
-                # Simple types - keep as is
-                flattened[key] = value
-            elif isinstance(value, list):
-                # Lists - convert to strings if they contain complex objects
-                if all(isinstance(item, (str, int, float, bool)) for item in value):
-                    flattened[key] = value
-                else:
-                    flattened[key] = str(value)
-            elif isinstance(value, dict):
-                # Dictionaries - flatten or convert to string
-                if key in ['mobile_navigation', 'related_content', 'navigation_path']:
-                    # Convert complex nested objects to strings
-                    flattened[key] = str(value)
-                else:
-                    # Flatten simple nested objects
-                    for nested_key, nested_value in value.items():
-                        flat_key = f"{key}_{nested_key}"
-                        if isinstance(nested_value, (str, int, float, bool)):
-                            flattened[flat_key] = nested_value
-                        else:
-                            flattened[flat_key] = str(nested_value)
-            else:
-                # Other types - convert to string
-                flattened[key] = str(value)
-        
-        return flattened
+        return _flatten_metadata_for_pinecone(metadata)
 
-    def _process_batch(self, batch: List[Document], batch_start: int) -> None:
+    def _record_failed_batch(self, ids: List[str], error: Exception) -> None:
+        """Append a batch that failed after all retries to the dead-letter JSONL file."""
+        entry = {"ids": ids, "error": repr(error), "timestamp": time.time()}
+        with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+        print(f"[TopicBasedEmbeddingCreator] Logged {len(ids)} failed chunk ids to {self.dead_letter_path}")
+    
+    @retry(
+        retry=retry_if_exception(_is_transient_error),
+        stop=stop_after_attempt(5),
+        wait=_wait_retry_after,
+        reraise=True
+    )
+    async def _process_batch(self, batch: List[Document], ids: List[str]) -> None:
         """Process a single batch of chunks."""
         texts = [doc.page_content for doc in batch]
         metadata_list = [doc.metadata for doc in batch]
         
-        # Create embeddings
-        embeddings = self.embedder.embed_documents(texts)
-        
-        # Prepare records for Pinecone
-        records = []
-        for j, (text, meta, embedding) in enumerate(zip(texts, metadata_list, embeddings)):
-            # Flatten metadata for Pinecone compatibility
-            flattened_meta = self._flatten_metadata_for_pinecone(meta)
+        # Reuse cached embeddings and only send cache misses to OpenAI;
+        # repeated texts (basmala, salawat, headers) are embedded once per batch
+        keys = [self._embedding_cache_key(text) for text in texts]
+        cached = self._load_cached_embeddings(keys)
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        if missing:
+            new_embeddings = await self._embed_texts(list(missing.values()))
+            new_entries = dict(zip(missing.keys(), new_embeddings))
+            self._store_cached_embeddings(new_entries)
+            cached.update(new_entries)
+        embeddings = [cached[key] for key in keys]
+        
+        # Prepare (id, values, metadata) tuples for Pinecone; metadata was
+        # already flattened when the chunk was split
+        records = list(zip(
+            ids,
+            embeddings,
+            [{**meta, "text": text} for meta, text in zip(metadata_list, texts)]
+        ))
+        
+        # Upsert (sync client, so keep it off the event loop)
+        await asyncio.to_thread(self._upsert_records, records)
+        
+        logger.info("[TopicBasedEmbeddingCreator] Upserted %d chunks to Pinecone", len(records))
+    
+    async def _embed_texts(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts with OpenAI, paced by the shared rate limiter when available."""
+        embedder = self._async_embedder or self.embedder
+        if self._rate_limiter is None:
+            return await embedder.aembed_documents(texts)
+        async with self._rate_limiter:
+            return await embedder.aembed_documents(texts)
+    
+    def _embed_with_batch_api(self, texts: List[str], poll_interval: float = 5.0) -> None:
+        """Embed uncached texts through the OpenAI Batch API and store them in the embedding cache."""
+        keys = [self._embedding_cache_key(text) for text in texts]
+        cached = self._load_cached_embeddings(keys)
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        if not missing:
+            print("[TopicBasedEmbeddingCreator] Batch API: all chunks already cached")
+            return
+        
+        client = openai.OpenAI(api_key=self.openai_api_key)
+        body_options = {"model": self.embedding_model}
+        if self.embedding_dimensions:
+            body_options["dimensions"] = self.embedding_dimensions
+        
+        # One request per unique text, split into files under the per-batch request limit
+        items = list(missing.items())
+        for start in range(0, len(items), _BATCH_API_MAX_REQUESTS):
+            group = items[start:start + _BATCH_API_MAX_REQUESTS]
+            with tempfile.NamedTemporaryFile("w", suffix=".jsonl", encoding="utf-8", delete=False) as f:
+                for key, text in group:
+                    f.write(json.dumps({
+                        "custom_id": key,
+                        "method": "POST",
+                        "url": "/v1/embeddings",
+                        "body": {**body_options, "input": text}
+                    }, ensure_ascii=False) + "\n")
+                request_path = f.name
+            try:
+                with open(request_path, "rb") as f:
+                    input_file = client.files.create(file=f, purpose="batch")
+            finally:
+                os.remove(request_path)
             
-            record = {
-                "id": f"topic-chunk-{batch_start + j}",
-                "values": embedding,
-                "metadata": {
-                    **flattened_meta,
-                    "text": text,
-                    "embedding_model": self.embedding_model
-                }
-            }
-            records.append(record)
-        
-        # Get index and upsert
-        index = self.pinecone.Index(self.index_name)
-        index.upsert(vectors=records)
-        
-        print(f"[TopicBasedEmbeddingCreator] Upserted {len(records)} chunks to Pinecone")
-
-    def test_topic_filtering(self, index, topic_folder: str = None, query: str = "What is Islam?", top_k: int = 3):
-        """Test topic-based filtering functionality."""
-        print(f"\n🧪 Testing topic filtering:")
-        print(f"  Topic: {topic_folder or 'All Topics'}")
-        print(f"  Query: {query}")
-        
-        query_vector = self.embedder.embed_query(query)
+            batch = client.batches.create(
+                input_file_id=input_file.id,
+                endpoint="/v1/embeddings",
+                completion_window="24h"
+            )
+            print(f"[TopicBasedEmbeddingCreator] Batch API: submitted {len(group)} texts as {batch.id}")
+            
+            delay = poll_interval
+            while batch.status not in ("completed", "failed", "expired", "cancelled"):
+                time.sleep(delay)
+                delay = min(delay * 1.5, 60.0)
+                batch = client.batches.retrieve(batch.id)
+            if batch.status != "completed" or not batch.output_file_id:
+                raise RuntimeError(f"OpenAI batch {batch.id} finished with status {batch.status}")
+            
+            entries = {}
+            failed = []
+            for line in client.files.content(batch.output_file_id).text.splitlines():
+                if not line:
+                    continue
+                result = _json_loads(line)
+                response = result.get("response") or {}
+                if response.get("status_code") == 200:
+                    entries[result["custom_id"]] = response["body"]["data"][0]["embedding"]
+                else:
+                    failed.append(result["custom_id"])
+            if failed:
+                # Embed the few failed requests in real time so every vector is cached before the upsert
+                retry_texts = [missing[key] for key in failed]
+                entries.update(zip(failed, self.embedder.embed_documents(retry_texts)))
+            self._store_cached_embeddings(entries)
+            print(f"[TopicBasedEmbeddingCreator] Batch API: cached {len(entries)} embeddings "
+                  f"({len(failed)} re-embedded in real time)")
+    
+    def _embedding_cache_key(self, text: str) -> str:
+        """Cache key for a chunk: hash of the embedding model and the chunk text."""
+        namespace = _embedding_cache_namespace(self.embedding_model, self.embedding_dimensions)
+        return hashlib.sha256((namespace + "\x00" + text).encode("utf-8")).hexdigest()
+    
+    def _get_embedding_cache(self) -> sqlite3.Connection:
+        """Open the SQLite embedding cache on first use."""
+        if self._embedding_cache is None:
+            self._embedding_cache = sqlite3.connect(self.embedding_cache_path, check_same_thread=False)
+            self._embedding_cache.execute("PRAGMA journal_mode=WAL")
+            self._embedding_cache.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings_f16 (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+            )
+        return self._embedding_cache
+    
+    def _load_cached_embeddings(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Fetch cached embeddings for the given keys, a few hundred keys per query."""
+        connection = self._get_embedding_cache()
+        cached = {}
+        for start in range(0, len(keys), _SQLITE_MAX_KEYS_PER_QUERY):
+            key_slice = keys[start:start + _SQLITE_MAX_KEYS_PER_QUERY]
+            placeholders = ",".join("?" * len(key_slice))
+            rows = connection.execute(
+                f"SELECT key, vector FROM embeddings_f16 WHERE key IN ({placeholders})", key_slice
+            ).fetchall()
+            cached.update((key, _decode_vector(vector)) for key, vector in rows)
+        return cached
+    
+    def _store_cached_embeddings(self, entries: Dict[str, List[float]]) -> None:
+        """Persist newly created embeddings to the cache."""
+        connection = self._get_embedding_cache()
+        with connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO embeddings_f16 (key, vector) VALUES (?, ?)",
+                [(key, _encode_vector(vector)) for key, vector in entries.items()]
+            )
+    
+    def _upsert_records(self, records: List[Tuple[str, List[float], Dict[str, Any]]]) -> None:
+        """Upsert records as parallel sub-batches over the index's thread pool."""
+        index = self._get_index()
+        if self.use_topic_namespaces:
+            by_namespace = {}
+            for record in records:
+                by_namespace.setdefault(record[2].get("topic_folder", ""), []).append(record)
+        else:
+            by_namespace = {None: records}
+        async_results = [
+            index.upsert(vectors=group[i:i + self.upsert_batch_size], namespace=namespace, async_req=True)
+            for namespace, group in by_namespace.items()
+            for i in range(0, len(group), self.upsert_batch_size)
+        ]
+        # Wait for all sub-batches; .get() re-raises any upsert error
+        for async_result in async_results:
+            async_result.get()
+
+    def _embed_queries(self, queries: List[str]) -> Dict[str, List[float]]:
+        """Embed each distinct query once, in a single batched request."""
+        unique_queries = list(dict.fromkeys(queries))
+        return dict(zip(unique_queries, self.embedder.embed_documents(unique_queries)))
+    
+    def _query_topic(self, index, topic_folder: str = None, query: str = "What is Islam?", top_k: int = 3,
+                     query_vector: Optional[List[float]] = None):
+        """Run one topic-filtered query against the index and return its matches."""
+        if query_vector is None:
+            query_vector = self._embed_query_cached(query)
+        
+        if self.use_topic_namespaces:
+            # Topic namespaces need no filter; "all" queries every namespace and keeps the best
+            if topic_folder and topic_folder != "all":
+                namespaces = [topic_folder]
+            else:
+                namespaces = list(index.describe_index_stats().namespaces or {})
+            matches = [
+                match
+                for namespace in namespaces
+                for match in index.query(vector=query_vector, top_k=top_k, include_metadata=True, namespace=namespace).matches
+            ]
+            return sorted(matches, key=lambda match: match.score, reverse=True)[:top_k]
         
         # Build filter for topic
         filter_dict = {}
         if topic_folder and topic_folder != "all":
             filter_dict["topic_folder"] = topic_folder
         
-        results = index.query(
+        return index.query(
             vector=query_vector,
             top_k=top_k,
             include_metadata=True,
             filter=filter_dict if filter_dict else None
-        )
+        ).matches
+    
+    def _print_topic_results(self, topic_folder: str, query: str, matches) -> None:
+        """Print the matches of a topic filtering test."""
+        print(f"\n🧪 Testing topic filtering:")
+        print(f"  Topic: {topic_folder or 'All Topics'}")
+        print(f"  Query: {query}")
         
-        print(f"📊 Query results: {len(results.matches)} matches found")
-        for i, match in enumerate(results.matches):
+        print(f"📊 Query results: {len(matches)} matches found")
+        for i, match in enumerate(matches):
             meta = match.metadata
             print(f"\nMatch {i+1}:")
             print(f"  Topic: {meta.get('topic_name', 'Unknown')}")
@@ -516,10 +1001,34 @@ class TopicBasedIslamicEmbeddingCreator:
             print(f"  Category: {meta.get('category', 'Unknown')}")
             print(f"  Score: {match.score:.3f}")
             print(f"  Text: {meta.get('text', '')[:100]}...")
+    
+    def test_topic_filtering(self, index = None, topic_folder: str = None, query: str = "What is Islam?", top_k: int = 3):
+        """Test topic-based filtering functionality."""
+        index = index or self._get_index()
+        self._print_topic_results(topic_folder, query, self._query_topic(index, topic_folder, query, top_k))
+    
+    def test_topic_filtering_concurrently(self, index = None, test_cases: List[tuple] = (), top_k: int = 3):
+        """Run several (topic_folder, query) tests at once and print the results in order."""
+        index = index or self._get_index()
+        query_vectors = self._embed_queries([query for _, query in test_cases])
+        
+        async def run_all():
+            return await asyncio.gather(
+                *(asyncio.to_thread(self._query_topic, index, topic_folder, query, top_k, query_vectors[query])
+                  for topic_folder, query in test_cases),
+                return_exceptions=True
+            )
+        
+        for (topic_folder, query), results in zip(test_cases, asyncio.run(run_all())):
+            if isinstance(results, Exception):
+                print(f"❌ Topic test failed for {topic_folder or 'All Topics'} / '{query}': {results}")
+                continue
+            self._print_topic_results(topic_folder, query, results)
 
 
 def main():
     """Test the topic-based embedding creator."""
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     try:
         print("🚀 Starting Topic-Based Islamic Embedding Creator...")
         creator = TopicBasedIslamicEmbeddingCreator()
@@ -542,14 +1051,12 @@ def main():
         # Test topic filtering
         print("\n🧪 Testing topic-based filtering...")
         
-        # Test with all topics
-        creator.test_topic_filtering(index, topic_folder=None, query="How to perform prayer?")
-        
-        # Test with specific topic
-        creator.test_topic_filtering(index, topic_folder="07_Namaz_Prayers", query="How to perform prayer?")
-        
-        # Test with another specific topic
-        creator.test_topic_filtering(index, topic_folder="04_Kitab_ul_Etiqadia", query="What is faith in Islam?")
+        # All topics, a specific topic and another specific topic, queried concurrently
+        creator.test_topic_filtering_concurrently(index, [
+            (None, "How to perform prayer?"),
+            ("07_Namaz_Prayers", "How to perform prayer?"),
+            ("04_Kitab_ul_Etiqadia", "What is faith in Islam?"),
+        ])
             
     except ValueError as e:
         print(f"❌ Configuration Error: {e}")
@@ -1,112 +1,344 @@
 import os
+import json
+import re
+import asyncio
+import heapq
+import logging
+from operator import attrgetter
+import hashlib
+import sqlite3
+import threading
+import time
+import unicodedata
+import weakref
+from collections import Counter, OrderedDict
+import numpy as np
+import httpx
+try:
+    import h2  # noqa: F401  # HTTP/2 support for httpx (pip install httpx[http2])
+    _HTTP2_AVAILABLE = True
+except ImportError:
+    _HTTP2_AVAILABLE = False
 from langchain_openai import OpenAIEmbeddings
 from typing import Any, List, Dict, Optional
 from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Must match the model and dimensions the index was built with
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-large")
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS")) if os.getenv("EMBEDDING_DIMENSIONS") else None
+_EMBEDDING_CACHE_NAMESPACE = f"{EMBEDDING_MODEL}:{EMBEDDING_DIMENSIONS}" if EMBEDDING_DIMENSIONS else EMBEDDING_MODEL
+
+# Query embeddings run in worker threads, so they share one sync keep-alive pool
+# (HTTP/2 when available) instead of paying a TLS handshake per cold request
+_http_client = httpx.Client(
+    limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+    http2=_HTTP2_AVAILABLE,
+    timeout=httpx.Timeout(15.0)
+)
+
 # Initialize embedder
 embedder = OpenAIEmbeddings(
-    model="text-embedding-3-large",
-    openai_api_key=os.getenv("OPENAI_API_KEY")
+    model=EMBEDDING_MODEL,
+    dimensions=EMBEDDING_DIMENSIONS,
+    openai_api_key=os.getenv("OPENAI_API_KEY"),
+    http_client=_http_client
 )
 
+# Query embeddings share the float16 SQLite cache written by the embedding creator
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", ".embedding_cache.db")
+_WHITESPACE_RE = re.compile(r'\s+')
+_TOPIC_PREFIX_RE = re.compile(r'^\d+_')  # Numbered topic folders like "03_Hadith_Mawdat_ul_Qurba"
+# Index built with one namespace per topic folder (TOPIC_NAMESPACES in the embedding creator)
+TOPIC_NAMESPACES = os.getenv("TOPIC_NAMESPACES", "").lower() in ("1", "true", "yes")
+_query_cache_db = None
+_query_cache_lock = threading.Lock()
+QUERY_VECTOR_CACHE_MAX_ENTRIES = 10_000
+_query_vectors: "OrderedDict[str, np.ndarray]" = OrderedDict()  # normalized query -> float16 vector
+_CONTEXT_SEPARATOR = "\n\n---\n\n"
+
+# Exact-match cache of search results keyed on (topic, normalized query, top_k, fetch_k).
+# Near-duplicate questions are already served by the chatbot's semantic answer cache.
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "300"))
+SEARCH_CACHE_MAX_ENTRIES = 2000
+_search_cache: "OrderedDict[tuple, tuple]" = OrderedDict()  # key -> (stored_at, documents)
+
+def clear_search_cache() -> None:
+    """Drop cached search results, e.g. after the index has been rebuilt or extended."""
+    _search_cache.clear()
+
+def _search_cache_get(key: tuple) -> Optional[List[Dict]]:
+    """Return cached documents for a search key if present and not expired."""
+    entry = _search_cache.get(key)
+    if entry is None:
+        return None
+    stored_at, documents = entry
+    if time.monotonic() - stored_at > SEARCH_CACHE_TTL:
+        _search_cache.pop(key, None)
+        return None
+    _search_cache.move_to_end(key)
+    return [dict(doc) for doc in documents]
+
+def _search_cache_put(key: tuple, documents: List[Dict]) -> None:
+    """Store search results, evicting the least recently used entries beyond the limit."""
+    _search_cache[key] = (time.monotonic(), [dict(doc) for doc in documents])
+    _search_cache.move_to_end(key)
+    while len(_search_cache) > SEARCH_CACHE_MAX_ENTRIES:
+        _search_cache.popitem(last=False)
+
+def normalize_query(query: str) -> str:
+    """Normalize a question so trivially different spellings share a cache entry."""
+    return _WHITESPACE_RE.sub(' ', unicodedata.normalize('NFKC', query)).strip().lower()
+
+def _get_query_cache_db() -> sqlite3.Connection:
+    """Open the SQLite embedding cache on first use."""
+    global _query_cache_db
+    if _query_cache_db is None:
+        _query_cache_db = sqlite3.connect(EMBEDDING_CACHE_PATH, check_same_thread=False)
+        _query_cache_db.execute("PRAGMA journal_mode=WAL")
+        _query_cache_db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings_f16 (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+    return _query_cache_db
+
+def _query_cache_key(normalized_query: str) -> str:
+    """Key of a normalized query in the shared SQLite embedding cache."""
+    return hashlib.sha256((_EMBEDDING_CACHE_NAMESPACE + "\x00" + normalized_query).encode("utf-8")).hexdigest()
+
+def _query_vector_lookup(normalized_query: str) -> Optional[np.ndarray]:
+    """Return a query embedding from the in-memory LRU, if present."""
+    with _query_cache_lock:
+        vector = _query_vectors.get(normalized_query)
+        if vector is not None:
+            _query_vectors.move_to_end(normalized_query)
+        return vector
+
+def _embed_normalized_queries(normalized_queries: List[str]) -> List[np.ndarray]:
+    """Embed normalized queries through the memory and on-disk caches, sending all misses in one API call."""
+    vectors = {}
+    for query in normalized_queries:
+        vector = _query_vector_lookup(query)
+        if vector is not None:
+            vectors[query] = vector
+    
+    missing = [query for query in dict.fromkeys(normalized_queries) if query not in vectors]
+    if missing:
+        keys = {query: _query_cache_key(query) for query in missing}
+        placeholders = ",".join("?" * len(keys))
+        with _query_cache_lock:
+            rows = _get_query_cache_db().execute(
+                f"SELECT key, vector FROM embeddings_f16 WHERE key IN ({placeholders})", list(keys.values())
+            ).fetchall()
+        stored = {key: np.frombuffer(blob, dtype=np.float16) for key, blob in rows}
+        to_embed = []
+        for query in missing:
+            if keys[query] in stored:
+                vectors[query] = stored[keys[query]]
+            else:
+                to_embed.append(query)
+        
+        if to_embed:
+            new_vectors = [np.asarray(v, dtype=np.float16) for v in embedder.embed_documents(to_embed)]
+            with _query_cache_lock:
+                connection = _get_query_cache_db()
+                with connection:
+                    connection.executemany(
+                        "INSERT OR REPLACE INTO embeddings_f16 (key, vector) VALUES (?, ?)",
+                        [(keys[query], vector.tobytes()) for query, vector in zip(to_embed, new_vectors)]
+                    )
+            vectors.update(zip(to_embed, new_vectors))
+        
+        with _query_cache_lock:
+            for query in missing:
+                _query_vectors[query] = vectors[query]
+            while len(_query_vectors) > QUERY_VECTOR_CACHE_MAX_ENTRIES:
+                _query_vectors.popitem(last=False)
+    
+    return [vectors[query] for query in normalized_queries]
+
+class EmbedBatcher:
+    """Coalesce query embeddings requested within a short window into one OpenAI call."""
+    
+    def __init__(self, max_batch: int = 32, max_wait: float = 0.015):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._pending = []  # (normalized_query, future) waiting for the next flush
+        self._flush_handle = None
+        self._tasks = set()  # In-flight batches; the loop only keeps weak references to tasks
+    
+    async def embed(self, query: str) -> np.ndarray:
+        """Embed a query (float16), sharing the API round-trip with other queries in the same window."""
+        normalized_query = normalize_query(query)
+        vector = _query_vector_lookup(normalized_query)
+        if vector is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._pending.append((normalized_query, future))
+            if len(self._pending) >= self.max_batch:
+                self._flush()
+            elif self._flush_handle is None:
+                self._flush_handle = loop.call_later(self.max_wait, self._flush)
+            vector = await future
+        return vector
+    
+    def _flush(self) -> None:
+        """Send everything queued so far as one batch."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._embed_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+    
+    async def _embed_batch(self, batch: list) -> None:
+        """Embed one batch off the event loop and resolve each waiter."""
+        try:
+            vectors = await asyncio.to_thread(_embed_normalized_queries, [query for query, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+_embed_batchers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, EmbedBatcher]" = weakref.WeakKeyDictionary()
+
+async def embed_query_vector(query: str) -> np.ndarray:
+    """Embed a query as a unit-normalized float32 array, micro-batching cache misses."""
+    loop = asyncio.get_running_loop()
+    batcher = _embed_batchers.get(loop)
+    if batcher is None:
+        batcher = _embed_batchers[loop] = EmbedBatcher()
+    vector = (await batcher.embed(query)).astype(np.float32)
+    norm = np.linalg.norm(vector)
+    if norm:
+        np.divide(vector, norm, out=vector)
+    return vector
+
+async def _query_matches(pinecone_index: Any, vector: List[float], top_k: int, topic_folder: Optional[str]) -> list:
+    """Query one topic or all topics, routing to per-topic namespaces when the index uses them."""
+    topic_specific = bool(topic_folder) and topic_folder != "all"
+    if not TOPIC_NAMESPACES:
+        results = await asyncio.to_thread(
+            pinecone_index.query,
+            vector=vector,
+            top_k=top_k,
+            include_metadata=True,
+            filter={"topic_folder": topic_folder} if topic_specific else None
+        )
+        return list(results.matches)
+    
+    # A topic namespace holds only that topic's vectors, so no metadata filter is needed
+    if topic_specific:
+        namespaces = [topic_folder]
+    else:
+        topics = await asyncio.to_thread(get_available_topics_from_index, pinecone_index)
+        namespaces = [topic["folder_name"] for topic in topics if topic["folder_name"] != "all"]
+    results = await asyncio.gather(*(
+        asyncio.to_thread(pinecone_index.query, vector=vector, top_k=top_k, include_metadata=True, namespace=namespace)
+        for namespace in namespaces
+    ))
+    return [match for result in results for match in result.matches]
+
+def _document_id(meta: Dict[str, Any]) -> str:
+    """Stable id for a retrieved chunk (source URL + chunk index), unchanged across index rebuilds."""
+    return hashlib.blake2b(
+        f"{meta.get('source_url', '')}#{meta.get('chunk_index', '')}".encode("utf-8"), digest_size=8
+    ).hexdigest()
+
+def _match_order(match: Any) -> tuple:
+    """Sort key for matches: descending score, then id."""
+    return (-getattr(match, 'score', 0.0), getattr(match, 'id', ''))
+
 async def search_documents_by_topic(
     pinecone_index: Any, 
     urdu_query: str, 
     topic_folder: str = None,
-    top_k: int = 3
+    top_k: int = 3,
+    fetch_k: Optional[int] = None
 ) -> List[Dict]:
-    """Search documents using Urdu query with topic filtering."""
+    """Search documents using Urdu query with topic filtering.
+    
+    fetch_k > top_k asks Pinecone for a wider candidate set and keeps the best top_k by score.
+    """
+    # Empty or punctuation-only queries can't retrieve anything useful; skip the API calls
+    query_text = (urdu_query or "").strip()
+    if len(query_text) < 2 or not any(ch.isalnum() for ch in query_text):
+        logger.debug("⚠️ Skipping search for empty or punctuation-only query: '%s'", query_text)
+        return []
+    
+    cache_key = (topic_folder or "all", normalize_query(urdu_query), top_k, fetch_k)
+    cached = _search_cache_get(cache_key)
+    if cached is not None:
+        logger.debug("⚡ Search cache hit: %d documents", len(cached))
+        return cached
+    
     try:
-        print("\n" + "="*80)
-        print("🔍 STARTING TOPIC-BASED DOCUMENT SEARCH")
-        print("="*80)
+        debug = logger.isEnabledFor(logging.DEBUG)
         
-        # Get index statistics first
-        try:
-            index_stats = pinecone_index.describe_index_stats()
-            total_vectors = index_stats.total_vector_count
-            print(f"📊 INDEX STATISTICS:")
-            print(f"   📈 Total vectors in index: {total_vectors:,}")
-            if hasattr(index_stats, 'namespaces') and index_stats.namespaces:
-                for namespace, stats in index_stats.namespaces.items():
-                    print(f"   📁 Namespace '{namespace}': {stats.vector_count:,} vectors")
-        except Exception as e:
-            print(f"⚠️ Could not get index stats: {e}")
-            total_vectors = "Unknown"
+        # Fetch index statistics (only needed for diagnostics) and the query embedding concurrently
+        if debug:
+            index_stats, query_vector = await asyncio.gather(
+                asyncio.to_thread(pinecone_index.describe_index_stats),
+                embed_query_vector(urdu_query),
+                return_exceptions=True
+            )
+        else:
+            index_stats = None
+            query_vector = await embed_query_vector(urdu_query)
         
-        print(f"\n🎯 SEARCH CONFIGURATION:")
-        print(f"   📂 Topic filter: {topic_folder or 'All Topics'}")
-        print(f"   📝 Urdu query: '{urdu_query}'")
-        print(f"   🔢 Top-K: {top_k}")
+        if debug:
+            logger.debug("🔍 STARTING TOPIC-BASED DOCUMENT SEARCH")
+            if isinstance(index_stats, Exception):
+                logger.debug("⚠️ Could not get index stats: %s", index_stats)
+            else:
+                logger.debug("📊 Total vectors in index: %s", f"{index_stats.total_vector_count:,}")
+                for namespace, stats in (getattr(index_stats, 'namespaces', None) or {}).items():
+                    logger.debug("   📁 Namespace '%s': %s vectors", namespace, f"{stats.vector_count:,}")
+            logger.debug("🎯 Topic filter: %s | Urdu query: '%s' | Top-K: %d",
+                         topic_folder or 'All Topics', urdu_query, top_k)
         
-        # Create single embedding for Urdu query
-        print(f"\n🔄 CREATING URDU EMBEDDING:")
-        try:
-            print(f"   🔄 Embedding: '{urdu_query[:50]}{'...' if len(urdu_query) > 50 else ''}'")
-            query_vector = embedder.embed_query(urdu_query)
-            print(f"   ✅ Embedding created (dimension: 3072)")
-        except Exception as e:
-            print(f"   ❌ Error creating embedding: {e}")
+        if isinstance(query_vector, Exception):
+            logger.error("❌ Error creating embedding: %s", query_vector)
             raise Exception("Failed to create query embedding")
         
-        # Build topic filter and show filtering logic
-        filter_dict = {}
-        if topic_folder and topic_folder != "all":
-            filter_dict["topic_folder"] = topic_folder
-            print(f"\n🎯 TOPIC FILTERING APPLIED:")
-            print(f"   📂 Filtering by topic_folder = '{topic_folder}'")
-            print(f"   🔍 This will search ONLY chunks from this topic")
-            print(f"   📊 Expected reduction in search space: ~90-95%")
-        else:
-            print(f"\n🌍 NO TOPIC FILTERING:")
-            print(f"   📂 Searching across ALL topics")
-            print(f"   📊 Will search all {total_vectors} vectors in index")
-        
-        # Simple single vector search
-        print(f"\n🔍 EXECUTING SIMPLE SEARCH:")
+        # Simple single vector search (one query per namespace for all-topic namespace searches)
         try:
-            print(f"   ⚡ Single vector search with top_k={top_k}...")
-            
-            results = pinecone_index.query(
-                vector=query_vector,
-                top_k=top_k,
-                include_metadata=True,
-                filter=filter_dict if filter_dict else None
-            )
+            candidate_k = max(top_k, fetch_k or top_k)
+            matches = await _query_matches(pinecone_index, query_vector.tolist(), candidate_k, topic_folder)
             
-            if results.matches:
-                print(f"   ✅ Found {len(results.matches)} matches")
-                print(f"   📊 Score range: {results.matches[0].score:.3f} to {results.matches[-1].score:.3f}")
-                top_matches = results.matches
+            if matches:
+                if debug:
+                    scores = [match.score for match in matches]
+                    logger.debug("   ✅ Found %d matches (score range %.3f to %.3f)", len(matches), max(scores), min(scores))
+                if len(matches) > top_k:
+                    top_matches = heapq.nlargest(top_k, matches, key=attrgetter('score'))
+                else:
+                    top_matches = matches
+                # Best score first with ties broken by id, so the same retrieved set always
+                # yields a byte-identical context and LLM prompt-cache prefixes stay stable
+                top_matches = sorted(top_matches, key=_match_order)
             else:
-                print(f"   ⚠️ No matches found")
+                logger.debug("   ⚠️ No matches found")
                 top_matches = []
                 
         except Exception as e:
-            print(f"   ❌ Error in vector search: {e}")
+            logger.error("❌ Error in vector search: %s", e)
             top_matches = []
-        
-        print(f"\n📊 SEARCH RESULTS:")
-        print(f"   🏆 Selected {len(top_matches)} matches")
-        
-        # Show final topic distribution
-        final_topics = {}
-        for match in top_matches:
-            topic = match.metadata.get('topic_name', 'Unknown')
-            final_topics[topic] = final_topics.get(topic, 0) + 1
-        
-        print(f"\n📂 FINAL TOPIC DISTRIBUTION:")
-        for topic, count in sorted(final_topics.items()):
-            print(f"   - {topic}: {count} chunks")
+            search_failed = True
+        else:
+            search_failed = False
         
         # Convert to list of dictionaries with enhanced metadata
-        print(f"\n📄 FINAL SELECTED DOCUMENTS:")
-        documents = []
-        for i, match in enumerate(top_matches):
-            meta = match.metadata or {}
-            doc_info = {
+        documents = [
+            {
                 "text": meta.get("text", ""),
                 "source": meta.get("source", "Unknown"),
                 "source_url": meta.get("source_url", ""),
@@ -115,25 +347,28 @@ async def search_documents_by_topic(
                 "topic_folder": meta.get("topic_folder", ""),
                 "content_type": meta.get("content_type", "text"),
                 "priority": meta.get("priority", "medium"),
-                "score": float(match.score) if hasattr(match, 'score') else 0.0
+                "score": float(getattr(match, 'score', 0.0)),
+                "doc_id": _document_id(meta)
             }
-            documents.append(doc_info)
-            
-            print(f"   📄 #{i+1}: {doc_info['topic_name']} | {doc_info['source']} | Score: {doc_info['score']:.3f}")
-            print(f"      🔗 URL: {doc_info['source_url']}")
-            print(f"      📝 Preview: {doc_info['text'][:100]}{'...' if len(doc_info['text']) > 100 else ''}")
-            print()
+            for match, meta in ((match, match.metadata or {}) for match in top_matches)
+        ]
         
-        print("="*80)
-        print(f"✅ SEARCH COMPLETED: {len(documents)} documents selected for context")
-        print("="*80)
+        if debug:
+            # Diagnostics are built only when debug logging is on
+            final_topics = Counter(doc["topic_name"] for doc in documents)
+            logger.debug("📂 Final topic distribution: %s", dict(sorted(final_topics.items())))
+            for i, doc in enumerate(documents, 1):
+                logger.debug("   📄 #%d: %s | %s | Score: %.3f | URL: %s | Preview: %s",
+                             i, doc['topic_name'], doc['source'], doc['score'], doc['source_url'], doc['text'][:100])
         
+        logger.debug("✅ Search completed: %d documents selected for context", len(documents))
+        
+        if not search_failed:
+            _search_cache_put(cache_key, documents)
         return documents
         
     except Exception as e:
-        print(f"\n❌ SEARCH ERROR: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ Search error: %s", e)
         return []
 
 def prepare_context_from_documents_with_attribution(documents: List[Dict]) -> str:
@@ -141,19 +376,15 @@ def prepare_context_from_documents_with_attribution(documents: List[Dict]) -> st
     if not documents:
         return ""
     
-    context_parts = []
-    for i, doc in enumerate(documents, 1):
-        if doc["text"].strip():
-            # Enhanced attribution with topic and source URL
-            attribution = f"[Source {i}: {doc['topic_name']} - {doc['source']}"
-            if doc.get('source_url'):
-                attribution += f" | URL: {doc['source_url']}"
-            attribution += f" | Category: {doc['category']}]"
-            
-            context_part = f"{attribution}\n{doc['text']}"
-            context_parts.append(context_part)
-    
-    return "\n\n---\n\n".join(context_parts)
+    # Each part is built with a single f-string and all parts are joined once
+    context_parts = [
+        f"[Source {i}: {doc['topic_name']} - {doc['source']}"
+        f"{' | URL: ' + doc['source_url'] if doc.get('source_url') else ''}"
+        f" | Category: {doc['category']}]\n{doc['text']}"
+        for i, doc in enumerate(documents, 1)
+        if doc["text"].strip()
+    ]
+    return _CONTEXT_SEPARATOR.join(context_parts)
 
 async def get_relevant_documents_by_topic(
     pinecone_index: Any, 
@@ -168,23 +399,79 @@ async def get_relevant_documents_by_topic(
     )
     return prepare_context_from_documents_with_attribution(documents)
 
+# Topics only change when the index is rebuilt, so the scan result is kept in memory
+# and in a small JSON sidecar that lets a fresh process start without any Pinecone call
+TOPICS_CACHE_TTL = float(os.getenv("TOPICS_CACHE_TTL", "600"))
+TOPICS_SIDECAR_PATH = os.getenv("TOPICS_SIDECAR_PATH", "topics.json")
+TOPICS_SIDECAR_MAX_AGE = float(os.getenv("TOPICS_SIDECAR_MAX_AGE", "86400"))
+_topics_cache = {"stored_at": 0.0, "topics": None}
+
+def _read_topics_sidecar() -> Optional[List[Dict[str, str]]]:
+    """Load topics from the sidecar file if it exists and is recent enough."""
+    try:
+        if time.time() - os.path.getmtime(TOPICS_SIDECAR_PATH) > TOPICS_SIDECAR_MAX_AGE:
+            return None
+        with open(TOPICS_SIDECAR_PATH, encoding="utf-8") as f:
+            topics = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return topics if isinstance(topics, list) and topics else None
+
+def _write_topics_sidecar(topics: List[Dict[str, str]]) -> None:
+    """Persist scanned topics for the next cold start; failures only cost a rescan."""
+    try:
+        with open(TOPICS_SIDECAR_PATH, "w", encoding="utf-8") as f:
+            json.dump(topics, f, ensure_ascii=False)
+    except OSError as e:
+        logger.warning("⚠️ Could not write topics sidecar: %s", e)
+
+def clear_topics_cache() -> None:
+    """Forget cached topics and delete the sidecar so the next lookup rescans the index."""
+    _topics_cache.update(stored_at=0.0, topics=None)
+    try:
+        os.remove(TOPICS_SIDECAR_PATH)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning("⚠️ Could not remove topics sidecar: %s", e)
+
 def get_available_topics_from_index(pinecone_index: Any) -> List[Dict[str, str]]:
-    """Get available topics from the index by querying unique topic_folder values."""
+    """Get available topics, from the in-memory cache, the sidecar file or an index scan."""
+    topics = _topics_cache["topics"]
+    if topics is None or time.monotonic() - _topics_cache["stored_at"] > TOPICS_CACHE_TTL:
+        topics = _read_topics_sidecar() if topics is None else None
+        if topics is None:
+            topics, scanned = _scan_topics_from_index(pinecone_index)
+            if not scanned:
+                # Don't cache the defaults; the next call retries the index
+                return [dict(topic) for topic in topics]
+            _write_topics_sidecar(topics)
+        _topics_cache.update(stored_at=time.monotonic(), topics=topics)
+    return [dict(topic) for topic in topics]
+
+def _scan_topics_from_index(pinecone_index: Any) -> tuple:
+    """Scan the index for unique topic_folder values; returns (topics, whether the scan found any)."""
     try:
-        print("🔍 Retrieving available topics from index...")
+        logger.debug("🔍 Retrieving available topics from index...")
         
         # Try to get index stats first
         stats = pinecone_index.describe_index_stats()
-        print(f"📊 Index has {stats.total_vector_count} total vectors")
+        logger.debug("📊 Index has %s total vectors", stats.total_vector_count)
         
-        # Query multiple times with different dummy vectors to get more diverse results
-        topics_set = set()
+        # Indexes built with TOPIC_NAMESPACES keep one namespace per topic folder,
+        # so the stats call already lists every topic without any vector query
+        topics_set = {
+            (namespace, _TOPIC_PREFIX_RE.sub('', namespace).replace('_', ' '))
+            for namespace in (getattr(stats, 'namespaces', None) or {})
+            if _TOPIC_PREFIX_RE.match(namespace)
+        }
         
-        # Try several different dummy vectors to capture more topics
-        dummy_vectors = [
-            [0.1] * 3072,  # Small positive values
-            [-0.1] * 3072,  # Small negative values
-            [0.01] * 3072,  # Very small values
+        # Otherwise query with opposite dummy vectors to sample both ends of the index; with
+        # cosine similarity positively scaled copies rank identically, so two are enough
+        dimension = getattr(stats, 'dimension', None) or EMBEDDING_DIMENSIONS or 3072
+        dummy_vectors = [] if topics_set else [
+            [0.1] * dimension,  # Small positive values
+            [-0.1] * dimension,  # Small negative values
         ]
         
         for i, dummy_vector in enumerate(dummy_vectors):
@@ -195,7 +482,7 @@ def get_available_topics_from_index(pinecone_index: Any) -> List[Dict[str, str]]
                     include_metadata=True
                 )
                 
-                print(f"🔍 Query {i+1}: Found {len(results.matches)} matches")
+                logger.debug("🔍 Query %d: Found %d matches", i + 1, len(results.matches))
                 
                 # Extract unique topics
                 for match in results.matches:
@@ -206,10 +493,10 @@ def get_available_topics_from_index(pinecone_index: Any) -> List[Dict[str, str]]
                         topics_set.add((topic_folder, topic_name))
                         
             except Exception as e:
-                print(f"⚠️ Error in query {i+1}: {e}")
+                logger.warning("⚠️ Error in query %d: %s", i + 1, e)
                 continue
         
-        print(f"📂 Found {len(topics_set)} unique topics from index")
+        logger.debug("📂 Found %d unique topics from index", len(topics_set))
         
         # Convert to list and sort
         topics = []
@@ -231,7 +518,7 @@ def get_available_topics_from_index(pinecone_index: Any) -> List[Dict[str, str]]
         
         # If we didn't find enough topics, add default ones
         if len(topics) < 5:
-            print("⚠️ Found fewer topics than expected, adding defaults...")
+            logger.warning("⚠️ Found fewer topics than expected, adding defaults...")
             default_topics = [
                 ("03_Hadith_Mawdat_ul_Qurba", "Hadith Mawdat ul Qurba"),
                 ("04_Kitab_ul_Etiqadia", "Kitab ul Etiqadia"),
@@ -260,33 +547,40 @@ def get_available_topics_from_index(pinecone_index: Any) -> List[Dict[str, str]]
                         "description": f"Content from {name}"
                     })
         
-        print(f"✅ Returning {len(topics)} topics total")
-        return topics
+        logger.info("✅ Returning %d topics total", len(topics))
+        return topics, bool(topics_set)
         
     except Exception as e:
-        print(f"⚠️ Error retrieving topics from index: {e}")
+        logger.warning("⚠️ Error retrieving topics from index: %s", e)
         # Return comprehensive default topics as fallback
-        return [
-            {"folder_name": "all", "display_name": "All Topics", "description": "Search across all Islamic knowledge categories"},
-            {"folder_name": "03_Hadith_Mawdat_ul_Qurba", "display_name": "Hadith Mawdat ul Qurba", "description": "Prophetic traditions and sayings"},
-            {"folder_name": "04_Kitab_ul_Etiqadia", "display_name": "Kitab ul Etiqadia", "description": "Islamic beliefs and theology"},
-            {"folder_name": "05_Awrad_Prayers", "display_name": "Awrad Prayers", "description": "Daily spiritual recitations"},
-            {"folder_name": "06_Dua_Collection", "display_name": "Dua Collection", "description": "Collection of Islamic supplications"},
-            {"folder_name": "07_Namaz_Prayers", "display_name": "Namaz Prayers", "description": "Islamic prayer guidelines"},
-            {"folder_name": "08_Taharat_Cleanliness", "display_name": "Taharat Cleanliness", "description": "Purification and cleanliness rules"},
-            {"folder_name": "09_Zakat_Khums", "display_name": "Zakat Khums", "description": "Islamic charity and financial obligations"},
-            {"folder_name": "10_Ramzan_Fasting", "display_name": "Ramzan Fasting", "description": "Ramadan and fasting guidelines"},
-            {"folder_name": "11_Nikah_Marriage", "display_name": "Nikah Marriage", "description": "Islamic marriage laws and procedures"},
-            {"folder_name": "12_Mayat_Death_Rites", "display_name": "Mayat Death Rites", "description": "Islamic funeral and burial procedures"},
-            {"folder_name": "13_Ayam_Special_Days", "display_name": "Ayam Special Days", "description": "Important Islamic dates and occasions"},
-            {"folder_name": "14_Kalmay", "display_name": "Kalmay", "description": "Islamic declarations of faith"},
-            {"folder_name": "15_Buzurgan_e_Deen", "display_name": "Buzurgan e Deen", "description": "Religious personalities and scholars"},
-            {"folder_name": "16_Daily_Wazaif", "display_name": "Daily Wazaif", "description": "Daily spiritual practices and recitations"},
-            {"folder_name": "17_Question_Answer", "display_name": "Question Answer", "description": "Religious questions and answers"},
-            {"folder_name": "18_Additional_Content", "display_name": "Additional Content", "description": "Additional Islamic knowledge and resources"}
-        ]
+        return _DEFAULT_TOPICS, False
+
+# Comprehensive default topics used when the index cannot be scanned
+_DEFAULT_TOPICS = [
+    {"folder_name": "all", "display_name": "All Topics", "description": "Search across all Islamic knowledge categories"},
+    {"folder_name": "03_Hadith_Mawdat_ul_Qurba", "display_name": "Hadith Mawdat ul Qurba", "description": "Prophetic traditions and sayings"},
+    {"folder_name": "04_Kitab_ul_Etiqadia", "display_name": "Kitab ul Etiqadia", "description": "Islamic beliefs and theology"},
+    {"folder_name": "05_Awrad_Prayers", "display_name": "Awrad Prayers", "description": "Daily spiritual recitations"},
+    {"folder_name": "06_Dua_Collection", "display_name": "Dua Collection", "description": "Collection of Islamic supplications"},
+    {"folder_name": "07_Namaz_Prayers", "display_name": "Namaz Prayers", "description": "Islamic prayer guidelines"},
+    {"folder_name": "08_Taharat_Cleanliness", "display_name": "Taharat Cleanliness", "description": "Purification and cleanliness rules"},
+    {"folder_name": "09_Zakat_Khums", "display_name": "Zakat Khums", "description": "Islamic charity and financial obligations"},
+    {"folder_name": "10_Ramzan_Fasting", "display_name": "Ramzan Fasting", "description": "Ramadan and fasting guidelines"},
+    {"folder_name": "11_Nikah_Marriage", "display_name": "Nikah Marriage", "description": "Islamic marriage laws and procedures"},
+    {"folder_name": "12_Mayat_Death_Rites", "display_name": "Mayat Death Rites", "description": "Islamic funeral and burial procedures"},
+    {"folder_name": "13_Ayam_Special_Days", "display_name": "Ayam Special Days", "description": "Important Islamic dates and occasions"},
+    {"folder_name": "14_Kalmay", "display_name": "Kalmay", "description": "Islamic declarations of faith"},
+    {"folder_name": "15_Buzurgan_e_Deen", "display_name": "Buzurgan e Deen", "description": "Religious personalities and scholars"},
+    {"folder_name": "16_Daily_Wazaif", "display_name": "Daily Wazaif", "description": "Daily spiritual practices and recitations"},
+    {"folder_name": "17_Question_Answer", "display_name": "Question Answer", "description": "Religious questions and answers"},
+    {"folder_name": "18_Additional_Content", "display_name": "Additional Content", "description": "Additional Islamic knowledge and resources"}
+]
 
 # Backward compatibility function
 async def get_relevant_documents(pinecone_index: Any, question: str, urdu_query: str = "", arabic_query: str = "") -> str:
     """Backward compatibility wrapper - searches all topics."""
-    return await get_relevant_documents_by_topic(pinecone_index, question, None, urdu_query, arabic_query)
+    # Prefer the Urdu query when given; arabic_query is accepted for old callers but unused
+    query = (urdu_query or question or "").strip()
+    if not query:
+        return ""
+    return await get_relevant_documents_by_topic(pinecone_index, query, None)